@@ -1,19 +1,99 @@
 import datetime
+import json
+import os
 
+import altair as alt
 import pandas as pd
 import streamlit as st
 
-from data_io import load_bookings_from_csv, save_bookings_to_csv
-from desk_booking import (check_desk_bookings, check_team_desk_bookings,
+from availability import build_availability_index, find_free_desks
+from booking_cache import MEMORY_BUDGET, DayCache, building_scope
+from data_io import load_bookings, save_day
+from desk_booking import (DEFAULT_MAX_WORKERS, GET_DESKS_URL,
+                          OCCUPANCY_FIELDS, authorise_token, build_desk_index,
+                          build_headers, build_occupancy_matrix,
+                          check_desk_bookings, check_team_desk_bookings,
                           collect_team_members, get_all_desk_bookings,
-                          get_desk_availability)
+                          get_desk_availability, occupancy_frame,
+                          read_team_file)
+from fetch_scheduler import AdaptiveLimiter, WindowTuner
+from history import WEEKDAYS, history_range, load_rollups, record_days
+from metrics import METRICS
+from name_index import NameIndex, matched_names
+from neighbourhoods import load_registry, neighbourhood_occupancy
+from prefetch import Prefetcher
+from seating import DeskClusters, banks_with_free_desks, desks_near_people
 
 # Replace with your actual API URL
-url = "https://unityplace.smarttwin.app/UnityPlace/mobile-api/v1/bookingavailability/GetDesks"
+url = GET_DESKS_URL
 
 # Fetch initial 'people' data from the API (Replace this with your actual API call)
 people_data = []
 
+# Optional metrics files for production monitoring: a JSON lines log appended after each
+# fetch, and a Prometheus text file rewritten on every run
+METRICS_LOG = os.environ.get("UP_METRICS_LOG")
+METRICS_PROM = os.environ.get("UP_METRICS_PROM")
+
+# Optional token for keeping the next few working days warm in the background. Prefetching
+# is a deployment setting, not a per-session one: it runs for everyone, with this token only.
+PREFETCH_TOKEN = os.environ.get("UP_PREFETCH_TOKEN")
+
+# Memory budget for the shared cache, in MB
+CACHE_BUDGET_MB = int(os.environ.get("UP_CACHE_BUDGET_MB", MEMORY_BUDGET // (1024 * 1024)))
+
+
+# Per building-day cache shared across reruns and sessions, so that only missing or expired
+# days are fetched. Sessions viewing the same range also share what is derived from it.
+@st.cache_resource
+def get_day_cache():
+    return DayCache(memory_budget=CACHE_BUDGET_MB * 1024 * 1024)
+
+
+# Multi-day window size learnt from past responses, shared across reruns
+@st.cache_resource
+def get_window_tuner():
+    return WindowTuner()
+
+
+# Upstream concurrency limit shared by every fetch in the process, so that what it learns
+# from throttling carries over to the next fetch and to other sessions
+@st.cache_resource
+def get_limiter():
+    return AdaptiveLimiter(DEFAULT_MAX_WORKERS)
+
+
+# Neighbourhood registry, loaded once and extended with the floors and desks seen in fetched data
+@st.cache_resource
+def get_registry():
+    return load_registry()
+
+
+# Background prefetcher that keeps the next few working days in the day cache, started once
+# per process when UP_PREFETCH_TOKEN is set
+@st.cache_resource
+def get_prefetcher():
+    prefetcher = Prefetcher(url, get_day_cache(), tuner=get_window_tuner(), limiter=get_limiter())
+    prefetcher.set_headers(build_headers(PREFETCH_TOKEN))
+    prefetcher.start()
+    return prefetcher
+
+
+# Build everything the tabs need from a fetched (or stored) range, once per range
+def build_booking_view(all_bookings, all_team_members, daily_desk_data_by_floor):
+    availability_index = build_availability_index(all_bookings, daily_desk_data_by_floor)  # Half-day bitsets for desk search
+    return {
+        'all_team_members': all_team_members,
+        'name_index': NameIndex(all_team_members),  # Normalized and fuzzy name lookup
+        'all_bookings': all_bookings,
+        'desk_index': build_desk_index(all_bookings),  # Index bookings by desk
+        'daily_desk_data_by_floor': daily_desk_data_by_floor,
+        'occupancy': build_occupancy_matrix(daily_desk_data_by_floor),
+        'availability_index': availability_index,
+        'desk_clusters': DeskClusters(availability_index.desks),  # Nearest desks, for seating teams together
+    }
+
+
 def main():
     st.set_page_config(page_title="UP - Desk Booking Insights 🧑‍💻️💡", page_icon="💡")
     st.title("UP - Desk Booking Insights 🧑‍💻️💡")
@@ -24,8 +104,11 @@ def main():
         # User inputs their token
         token = st.text_input("Enter your API token:", type="password")
 
-        # Load bookings from CSV
-        all_bookings = load_bookings_from_csv()
+        # Optionally keep fetched days in a local snapshot store, so history is available on start-up
+        use_snapshot = st.checkbox("Keep a local snapshot of fetched data", value=False)
+
+        # Optionally add each fetch's per-floor desk counts to the long-range occupancy history
+        record_history = st.checkbox("Record occupancy history", value=False, help="Adds the desk counts of fetched days before today; upcoming days are still being booked.")
 
         # Adding a date range selector
         date_range = st.date_input("Select a date range:", [datetime.date.today(), datetime.date.today() + datetime.timedelta(days=3)])
@@ -38,25 +121,81 @@ def main():
         # Initialize session state for all_team_members and daily_desk_data_by_floor if they don't exist
         if 'all_team_members' not in st.session_state:
             st.session_state['all_team_members'] = []
+            st.session_state['name_index'] = NameIndex([])
         if 'daily_desk_data_by_floor' not in st.session_state:
             st.session_state['daily_desk_data_by_floor'] = {}
+            st.session_state['occupancy'] = build_occupancy_matrix({})
 
         if token:
-            headers = {
-                "Authorization": f"Bearer {token}",
-                "Content-Type": "application/x-www-form-urlencoded",
-                "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/116.0.0.0 Safari/537.36",
-            }
+            headers = build_headers(token)
+
+            # Start from the stored snapshot for the selected range if nothing has been fetched yet.
+            # The snapshot holds everyone's bookings, so it is only read once the token has been accepted.
+            if use_snapshot and 'all_bookings' not in st.session_state and len(date_range) == 2:
+                auth_error = authorise_token(url, headers, get_day_cache(), start_date.strftime('%Y-%m-%d'), limiter=get_limiter(), tuner=get_window_tuner())
+                if auth_error is not None:
+                    st.warning(f"⚠️ The stored snapshot was not loaded because the API token was not accepted ({auth_error}).")
+                else:
+                    all_bookings, all_team_members, daily_desk_data, daily_desk_data_by_floor = load_bookings(start_date, end_date)
+                    if len(all_bookings):
+                        st.session_state.update(build_booking_view(all_bookings, all_team_members, daily_desk_data_by_floor))
+
+            # The next few working days are kept warm when the deployment sets a prefetch token
+            if PREFETCH_TOKEN:
+                prefetcher = get_prefetcher()
+                if prefetcher.last_run:
+                    st.caption(f"Upcoming working days last prefetched at {datetime.datetime.fromtimestamp(prefetcher.last_run).strftime('%H:%M:%S')}")
 
             if st.button("Fetch Booking Data"):
-                all_bookings, all_team_members, daily_desk_data, daily_desk_data_by_floor = get_all_desk_bookings(url, headers, start_date=start_date, end_date=end_date)
-                st.session_state['all_team_members'] = all_team_members  # Update session state
-                st.session_state['all_bookings'] = all_bookings  # Update session state
-                st.session_state['daily_desk_data_by_floor'] = daily_desk_data_by_floor  # Update session state
-                st.write("✅ Booking data fetched successfully!")
+                # Reuse the view another session built for this range if the token may read it.
+                # Session state only references the shared view, so it is held in memory once.
+                scope = building_scope(url)
+                range_key = (start_date.strftime('%Y-%m-%d'), end_date.strftime('%Y-%m-%d'))
+                view = get_day_cache().get_range(scope, *range_key) if get_day_cache().is_authorised(headers) else None
+                fetch_errors = {}
+                if view is None:
+                    with st.spinner("Fetching desk booking data..."):
+                        all_bookings, all_team_members, daily_desk_data, daily_desk_data_by_floor, fetch_errors = get_all_desk_bookings(url, headers, start_date=start_date, end_date=end_date, cache=get_day_cache(), on_day_fetched=save_day if use_snapshot else None, limiter=get_limiter(), tuner=get_window_tuner())
+                        view = build_booking_view(all_bookings, all_team_members, daily_desk_data_by_floor)
+                    if not fetch_errors:  # only complete ranges are shared
+                        get_day_cache().put_range(scope, *range_key, view)
+                st.session_state.update(view)
+                st.session_state['fetch_errors'] = fetch_errors  # Update session state
+                daily_desk_data_by_floor = view['daily_desk_data_by_floor']
+                for floors in daily_desk_data_by_floor.values():
+                    get_registry().add_floors(floors)
+                if record_history:
+                    record_days(daily_desk_data_by_floor)
+                if not fetch_errors:
+                    st.write("✅ Booking data fetched successfully!")
+                if METRICS_LOG:
+                    METRICS.write_json_log(METRICS_LOG)
+
+            # Show which days could not be fetched; the rest of the range is still usable
+            fetch_errors = st.session_state.get('fetch_errors', {})
+            if fetch_errors:
+                st.warning(f"⚠️ {len(fetch_errors)} day(s) could not be fetched. Try fetching again later to fill the gaps.")
+                st.table(pd.DataFrame({'date': list(fetch_errors), 'status': list(fetch_errors.values())}))
             
+            # Show how much memory the shared cache holds against its budget
+            footprint = get_day_cache().footprint()
+            st.caption(f"Cache: {footprint['days']} days and {footprint['ranges']} ranges, {footprint['bytes'] / 1024 / 1024:.1f} of {footprint['budget'] / 1024 / 1024:.0f} MB "
+                       f"({footprint['hits']} hits, {footprint['misses']} misses, {footprint['evictions']} evictions)")
+            with st.expander("Cached entries"):
+                st.dataframe(pd.DataFrame(get_day_cache().report(), columns=['entry', 'kind', 'bytes', 'expires_in']), hide_index=True)
+
+            # Allow a single cached day, or the whole cache, to be invalidated
+            cached_dates = get_day_cache().dates()
+            clear_option = st.selectbox("Cached data to clear:", ["All days"] + cached_dates)
             if st.button("Clear Cached Data"):
-                get_all_desk_bookings.clear()
+                if clear_option == "All days":
+                    get_day_cache().clear()
+                else:
+                    get_day_cache().invalidate(clear_option)
+
+        # Timings for fetching, parsing and rendering, to see where a slow run spends its time
+        if st.checkbox("Show diagnostics", value=False):
+            show_diagnostics()
 
         st.header("How to find your API token:")
         st.markdown("""
@@ -73,519 +212,138 @@ def main():
 
     tab1, tab2, tab3, tab4 = st.tabs(["Office Capacity", "Desk Availability", "People Finder", "Team Finder"])
 
-    with tab1:
+    with tab1, METRICS.timer('tab_render_seconds', tab="Office Capacity"):
         st.markdown("""
-                    Use the graphs below to quickly see how many desks are booked or available for each floor in the building within the selected date range.
+                    Use the heatmap below to quickly see how busy each floor in the building is within the selected date range, then pick a date to see how many desks are booked or available on each floor.
                     """)
-        # Add a table to display daily desk counts by floor
-        for date, floors in st.session_state['daily_desk_data_by_floor'].items():  # Use session state
-            st.subheader(date)
-            floor_df = pd.DataFrame(floors.values(), index=floors.keys())
-            floor_df['booked_desks'] = floor_df[['booked_desks_am', 'booked_desks_pm']].max(axis=1)
-            floor_df['available_desks'] = floor_df['total_desks'] - floor_df['booked_desks']
-            floor_df = floor_df[['booked_desks', 'available_desks']]
+        # Show every date and floor in one heatmap, built from the occupancy array computed at fetch time
+        occupancy = st.session_state['occupancy']
+        if occupancy.dates:
+            occupancy_df = occupancy_frame(occupancy)
+            occupancy_df['booked_share'] = occupancy_df['booked_desks'] / occupancy_df['total_desks'].where(occupancy_df['total_desks'] > 0)
+            heatmap = alt.Chart(occupancy_df).mark_rect().encode(
+                x=alt.X('date:O', title=None),
+                y=alt.Y('floor:N', title=None),
+                color=alt.Color('booked_share:Q', title="Booked", scale=alt.Scale(domain=[0, 1], scheme='orangered'), legend=alt.Legend(format='%')),
+                tooltip=['date', 'floor', 'booked_desks', 'available_desks', 'total_desks'],
+            )
+            st.altair_chart(heatmap, width='stretch')
+
+            # Drill down into a single date
+            drill_down_date = st.selectbox("Show booked and available desks per floor for:", occupancy.dates)
+            date_values = occupancy.values[occupancy.dates.index(drill_down_date)]
+            floor_df = pd.DataFrame(date_values[:, [OCCUPANCY_FIELDS.index('booked_desks'), OCCUPANCY_FIELDS.index('available_desks')]], index=occupancy.floors, columns=['booked_desks', 'available_desks'])
             st.bar_chart(floor_df)
 
-    with tab2:
+        # Break a floor down by neighbourhood, using the registry's desk -> neighbourhood lookup
+        if 'all_bookings' in st.session_state and st.checkbox("Show desks by neighbourhood"):
+            capacity_floor = st.selectbox("Floor:", get_registry().floors())
+            neighbourhood_df = neighbourhood_occupancy(st.session_state['all_bookings'], get_registry(), capacity_floor)
+            neighbourhood_df['booked_share'] = neighbourhood_df['booked_desks'] / neighbourhood_df['total_desks'].where(neighbourhood_df['total_desks'] > 0)
+            heatmap = alt.Chart(neighbourhood_df).mark_rect().encode(
+                x=alt.X('yearmonthdate(date):O', title=None),
+                y=alt.Y('neighbourhood:N', title=None),
+                color=alt.Color('booked_share:Q', title="Booked", scale=alt.Scale(domain=[0, 1], scheme='orangered'), legend=alt.Legend(format='%')),
+                tooltip=[alt.Tooltip('date:T', format='%Y-%m-%d'), 'neighbourhood', 'booked_desks', 'available_desks', 'total_desks'],
+            )
+            st.altair_chart(heatmap, width='stretch')
+
+        # Long-range trends from the pre-aggregated rollups in the occupancy history
+        first_recorded, last_recorded, recorded_days = history_range()
+        if recorded_days and st.checkbox("Show occupancy trends"):
+            st.caption(f"{recorded_days} days recorded, from {first_recorded} to {last_recorded}.")
+            trend_period = st.radio("Group by:", ["Week", "Month", "Day of week"], horizontal=True)
+            trend_months = st.slider("Months of history:", min_value=1, max_value=24, value=12)
+            trend_start = datetime.date.today() - datetime.timedelta(days=round(trend_months * 30.44))
+            trend_df = load_rollups({"Week": 'week', "Month": 'month', "Day of week": 'weekday'}[trend_period], trend_start, datetime.date.today())
+            if trend_period == "Day of week":
+                x = alt.X('bucket:N', title=None, sort=WEEKDAYS)
+            else:
+                x = alt.X('bucket:O', title=None)
+            trend = alt.Chart(trend_df).mark_line(point=True).encode(
+                x=x,
+                y=alt.Y('booked_share:Q', title="Average booked", axis=alt.Axis(format='%')),
+                color=alt.Color('floor:N', title="Floor"),
+                tooltip=['bucket', 'floor', 'days', alt.Tooltip('average_booked_desks:Q', format='.1f'), 'peak_booked_desks', alt.Tooltip('booked_share:Q', format='.0%')],
+            )
+            st.altair_chart(trend, width='stretch')
+
+    with tab2, METRICS.timer('tab_render_seconds', tab="Desk Availability"):
         st.title("Desk Availability (per Neighbourhood)")
         st.markdown("""
                     This tab allows you to check specific neighbourhood of desks for availability. Each date within the selected date range is displayed in a seperate expander. Expand a date to see the existing bookings for each day.
                     """)
         
 
-        level6_neighbourhood_a_station = [
-            "Desk 6.A01.1",
-            "Desk 6.A01.2",
-            "Desk 6.A01.3",
-            "Desk 6.A01.4",
-            "Desk 6.A01.5",
-            "Desk 6.A01.6",
-            "Desk 6.A01.7",
-            "Desk 6.A01.8",
-            "Desk 6.A02.1",
-            "Desk 6.A02.2",
-            "Desk 6.A02.3",
-            "Desk 6.A02.4",
-            "Desk 6.A03.1",
-            "Desk 6.A03.2",
-            "Desk 6.A03.3",
-            "Desk 6.A03.4",
-            "Desk 6.A04.1",
-            "Desk 6.A04.2",
-            "Desk 6.A04.3",
-            "Desk 6.A04.4",
-            "Desk 6.A05.1",
-            "Desk 6.A05.2",
-            "Desk 6.A05.3",
-            "Desk 6.A05.4",
-            "Desk 6.A06.1",
-            "Desk 6.A06.2",
-            "Desk 6.A06.3",
-            "Desk 6.A06.4",
-            "Desk 6.A06.5",
-            "Desk 6.A06.6",
-            "Desk 6.A06.7",
-            "Desk 6.A06.8",
-            "Desk 6.A07.1",
-            "Desk 6.A07.2",
-            "Desk 6.A07.3",
-            "Desk 6.A07.4",
-            "Desk 6.A07.5",
-            "Desk 6.A07.6",
-            "Desk 6.A07.7",
-            "Desk 6.A07.8",
-            "Desk 6.A08.1",
-            "Desk 6.A08.2",
-            "Desk 6.A08.3",
-            "Desk 6.A08.4",
-            "Desk 6.A08.5",
-            "Desk 6.A08.6",
-            "Desk 6.A08.7",
-            "Desk 6.A08.8",
-            "Desk 6.A09.1",
-            "Desk 6.A09.2",
-            "Desk 6.A09.3",
-            "Desk 6.A09.4",
-            "Desk 6.A09.5",
-            "Desk 6.A09.6",
-            "Desk 6.A09.7",
-            "Desk 6.A09.8",
-            "Desk 6.A10.1",
-            "Desk 6.A10.2",
-            "Desk 6.A10.3",
-            "Desk 6.A10.4",
-            "Desk 6.A11.1",
-            "Desk 6.A11.2",
-            "Desk 6.A11.3",
-            "Desk 6.A11.4",
-            "Desk 6.A12.1",
-            "Desk 6.A12.2",
-            "Desk 6.A12.3",
-            "Desk 6.A12.4",
-            "Desk 6.A12.5",
-            "Desk 6.A12.6",
-            "Desk 6.A12.7",
-            "Desk 6.A12.8",
-            "Desk 6.A21.1",
-            "Desk 6.A21.2",
-            "Desk 6.A21.3",
-            "Desk 6.A21.4",
-            "Desk 6.A21.5",
-            "Desk 6.A21.6",
-            "Desk 6.A21.7",
-            "Desk 6.A21.8",
-            "Desk 6.A22.1",
-            "Desk 6.A22.2",
-            "Desk 6.A22.3",
-            "Desk 6.A22.4",
-            "Desk 6.A22.5",
-            "Desk 6.A22.6",
-            "Desk 6.A22.7",
-            "Desk 6.A22.8"
-        ]
-
-        level6_neighbourhood_a_city = [
-            "Desk 6.A13.1",
-            "Desk 6.A13.2",
-            "Desk 6.A13.3",
-            "Desk 6.A13.4",
-            "Desk 6.A13.5",
-            "Desk 6.A13.6",
-            "Desk 6.A13.7",
-            "Desk 6.A13.8",
-            "Desk 6.A14.1",
-            "Desk 6.A14.2",
-            "Desk 6.A14.3",
-            "Desk 6.A14.4",
-            "Desk 6.A14.5",
-            "Desk 6.A14.6",
-            "Desk 6.A14.7",
-            "Desk 6.A14.8",
-            "Desk 6.A15.1",
-            "Desk 6.A15.2",
-            "Desk 6.A15.3",
-            "Desk 6.A15.4",
-            "Desk 6.A16.1",
-            "Desk 6.A16.2",
-            "Desk 6.A16.3",
-            "Desk 6.A16.4",
-            "Desk 6.A16.5",
-            "Desk 6.A16.6",
-            "Desk 6.A16.7",
-            "Desk 6.A16.8",
-            "Desk 6.A17.1",
-            "Desk 6.A17.2",
-            "Desk 6.A17.3",
-            "Desk 6.A17.4",
-            "Desk 6.A17.5",
-            "Desk 6.A17.6",
-            "Desk 6.A17.7",
-            "Desk 6.A17.8",
-            "Desk 6.A18.1",
-            "Desk 6.A18.2",
-            "Desk 6.A18.3",
-            "Desk 6.A18.4",
-            "Desk 6.A19.1",
-            "Desk 6.A19.2",
-            "Desk 6.A19.3",
-            "Desk 6.A19.4",
-            "Desk 6.A19.5",
-            "Desk 6.A19.6",
-            "Desk 6.A19.7",
-            "Desk 6.A19.8",
-            "Desk 6.A20.1",
-            "Desk 6.A20.2",
-            "Desk 6.A20.3",
-            "Desk 6.A20.4",
-            "Desk 6.A20.5",
-            "Desk 6.A20.6",
-            "Desk 6.A20.7",
-            "Desk 6.A20.8"
-        ]
-
-        level6_neighbourhood_b_station = [
-            "Desk 6.B01.1",
-            "Desk 6.B01.2",
-            "Desk 6.B01.3",
-            "Desk 6.B01.4",
-            "Desk 6.B02.1",
-            "Desk 6.B02.2",
-            "Desk 6.B02.3",
-            "Desk 6.B02.4",
-            "Desk 6.B03.1",
-            "Desk 6.B03.2",
-            "Desk 6.B03.3",
-            "Desk 6.B03.4",
-            "Desk 6.B03.5",
-            "Desk 6.B03.6",
-            "Desk 6.B03.7",
-            "Desk 6.B03.8",
-            "Desk 6.B04.1",
-            "Desk 6.B04.2",
-            "Desk 6.B04.3",
-            "Desk 6.B04.4",
-            "Desk 6.B04.5",
-            "Desk 6.B04.6",
-            "Desk 6.B04.7",
-            "Desk 6.B04.8",
-            "Desk 6.B05.1",
-            "Desk 6.B05.2",
-            "Desk 6.B05.3",
-            "Desk 6.B05.4",
-            "Desk 6.B06.1",
-            "Desk 6.B06.2",
-            "Desk 6.B06.3",
-            "Desk 6.B06.4",
-            "Desk 6.B07.1",
-            "Desk 6.B07.2",
-            "Desk 6.B07.3",
-            "Desk 6.B07.4",
-            "Desk 6.B08.1",
-            "Desk 6.B08.2",
-            "Desk 6.B08.3",
-            "Desk 6.B08.4",
-            "Desk 6.B17.1",
-            "Desk 6.B17.2",
-            "Desk 6.B17.3",
-            "Desk 6.B17.4",
-            "Desk 6.B17.5",
-            "Desk 6.B17.6",
-            "Desk 6.B17.7",
-            "Desk 6.B17.8",
-            "Desk 6.B18.1",
-            "Desk 6.B18.2",
-            "Desk 6.B18.3",
-            "Desk 6.B18.4",
-            "Desk 6.B18.5",
-            "Desk 6.B18.6",
-            "Desk 6.B18.7",
-            "Desk 6.B18.8"
-        ]
-
-        level6_neighbourhood_b_city = [
-            "Desk 6.B09.1",
-            "Desk 6.B09.2",
-            "Desk 6.B09.3",
-            "Desk 6.B09.4",
-            "Desk 6.B09.5",
-            "Desk 6.B09.6",
-            "Desk 6.B09.7",
-            "Desk 6.B09.8",
-            "Desk 6.B10.1",
-            "Desk 6.B10.2",
-            "Desk 6.B10.3",
-            "Desk 6.B10.4",
-            "Desk 6.B10.5",
-            "Desk 6.B10.6",
-            "Desk 6.B10.7",
-            "Desk 6.B10.8",
-            "Desk 6.B11.1",
-            "Desk 6.B11.2",
-            "Desk 6.B11.3",
-            "Desk 6.B11.4",
-            "Desk 6.B11.5",
-            "Desk 6.B11.6",
-            "Desk 6.B11.7",
-            "Desk 6.B11.8",
-            "Desk 6.B12.1",
-            "Desk 6.B12.2",
-            "Desk 6.B12.3",
-            "Desk 6.B12.4",
-            "Desk 6.B13.1",
-            "Desk 6.B13.2",
-            "Desk 6.B13.3",
-            "Desk 6.B13.4",
-            "Desk 6.B14.1",
-            "Desk 6.B14.2",
-            "Desk 6.B14.3",
-            "Desk 6.B14.4",
-            "Desk 6.B14.5",
-            "Desk 6.B14.6",
-            "Desk 6.B14.7",
-            "Desk 6.B14.8",
-            "Desk 6.B15.1",
-            "Desk 6.B15.2",
-            "Desk 6.B15.3",
-            "Desk 6.B15.4",
-            "Desk 6.B15.5",
-            "Desk 6.B15.6",
-            "Desk 6.B15.7",
-            "Desk 6.B15.8",
-            "Desk 6.B16.1",
-            "Desk 6.B16.2",
-            "Desk 6.B16.3",
-            "Desk 6.B16.4",
-            "Desk 6.B16.5",
-            "Desk 6.B16.6",
-            "Desk 6.B16.7",
-            "Desk 6.B16.8"
-        ]
-
-        level6_neighbourhood_c_station = [
-            "Desk 6.C01.1",
-            "Desk 6.C01.2",
-            "Desk 6.C01.3",
-            "Desk 6.C01.4",
-            "Desk 6.C01.5",
-            "Desk 6.C01.6",
-            "Desk 6.C01.7",
-            "Desk 6.C01.8",
-            "Desk 6.C02.1",
-            "Desk 6.C02.2",
-            "Desk 6.C02.3",
-            "Desk 6.C02.4",
-            "Desk 6.C03.1",
-            "Desk 6.C03.2",
-            "Desk 6.C03.3",
-            "Desk 6.C03.4",
-            "Desk 6.C04.1",
-            "Desk 6.C04.2",
-            "Desk 6.C04.3",
-            "Desk 6.C04.4",
-            "Desk 6.C05.1",
-            "Desk 6.C05.2",
-            "Desk 6.C05.3",
-            "Desk 6.C05.4",
-            "Desk 6.C06.1",
-            "Desk 6.C06.2",
-            "Desk 6.C06.3",
-            "Desk 6.C06.4",
-            "Desk 6.C06.5",
-            "Desk 6.C06.6",
-            "Desk 6.C06.7",
-            "Desk 6.C06.8",
-            "Desk 6.C07.1",
-            "Desk 6.C07.2",
-            "Desk 6.C07.3",
-            "Desk 6.C07.4",
-            "Desk 6.C08.1",
-            "Desk 6.C08.2",
-            "Desk 6.C08.3",
-            "Desk 6.C08.4",
-            "Desk 6.C09.1",
-            "Desk 6.C09.2",
-            "Desk 6.C09.3",
-            "Desk 6.C09.4",
-            "Desk 6.C09.5",
-            "Desk 6.C09.6",
-            "Desk 6.C09.7",
-            "Desk 6.C09.8",
-            "Desk 6.C10.1",
-            "Desk 6.C10.2",
-            "Desk 6.C10.3",
-            "Desk 6.C10.4",
-            "Desk 6.C10.5",
-            "Desk 6.C10.6",
-            "Desk 6.C10.7",
-            "Desk 6.C10.8"
-        ]
-        
-        level6_neighbourhood_d_station = [
-            "Desk 6.D01.1",
-            "Desk 6.D01.2",
-            "Desk 6.D01.3",
-            "Desk 6.D01.4",
-            "Desk 6.D01.5",
-            "Desk 6.D01.6",
-            "Desk 6.D01.7",
-            "Desk 6.D01.8",
-            "Desk 6.D02.1",
-            "Desk 6.D02.2",
-            "Desk 6.D02.3",
-            "Desk 6.D02.4",
-            "Desk 6.D03.1",
-            "Desk 6.D03.2",
-            "Desk 6.D03.3",
-            "Desk 6.D03.4",
-            "Desk 6.D04.1",
-            "Desk 6.D04.2",
-            "Desk 6.D04.3",
-            "Desk 6.D04.4",
-            "Desk 6.D04.5",
-            "Desk 6.D04.6",
-            "Desk 6.D04.7",
-            "Desk 6.D04.8",
-            "Desk 6.D05.1",
-            "Desk 6.D05.2",
-            "Desk 6.D05.3",
-            "Desk 6.D05.4",
-            "Desk 6.D05.5",
-            "Desk 6.D05.6",
-            "Desk 6.D05.7",
-            "Desk 6.D05.8",
-            "Desk 6.D06.1",
-            "Desk 6.D06.2",
-            "Desk 6.D06.3",
-            "Desk 6.D06.4",
-            "Desk 6.D07.1",
-            "Desk 6.D07.2",
-            "Desk 6.D07.3",
-            "Desk 6.D07.4",
-            "Desk 6.D08.1",
-            "Desk 6.D08.2",
-            "Desk 6.D08.3",
-            "Desk 6.D08.4",
-            "Desk 6.D08.5",
-            "Desk 6.D08.6",
-            "Desk 6.D08.7",
-            "Desk 6.D08.8",
-            "Desk 6.D16.1",
-            "Desk 6.D16.2",
-            "Desk 6.D16.3",
-            "Desk 6.D16.4",
-            "Desk 6.D16.5",
-            "Desk 6.D16.6",
-            "Desk 6.D16.7",
-            "Desk 6.D16.8",
-            "Desk 6.D17.1",
-            "Desk 6.D17.2",
-            "Desk 6.D17.3",
-            "Desk 6.D17.4",
-            "Desk 6.D17.5",
-            "Desk 6.D17.6",
-            "Desk 6.D17.7",
-            "Desk 6.D17.8"
-        ]
-        
-        level6_neighbourhood_d_city = [
-            "Desk 6.D09.1",
-            "Desk 6.D09.2",
-            "Desk 6.D09.3",
-            "Desk 6.D09.4",
-            "Desk 6.D09.5",
-            "Desk 6.D09.6",
-            "Desk 6.D09.7",
-            "Desk 6.D09.8",
-            "Desk 6.D10.1",
-            "Desk 6.D10.2",
-            "Desk 6.D10.3",
-            "Desk 6.D10.4",
-            "Desk 6.D11.1",
-            "Desk 6.D11.2",
-            "Desk 6.D11.3",
-            "Desk 6.D11.4",
-            "Desk 6.D11.5",
-            "Desk 6.D11.6",
-            "Desk 6.D11.7",
-            "Desk 6.D11.8",
-            "Desk 6.D12.1",
-            "Desk 6.D12.2",
-            "Desk 6.D12.3",
-            "Desk 6.D12.4",
-            "Desk 6.D12.5",
-            "Desk 6.D12.6",
-            "Desk 6.D12.7",
-            "Desk 6.D12.8",
-            "Desk 6.D13.1",
-            "Desk 6.D13.2",
-            "Desk 6.D13.3",
-            "Desk 6.D13.4",
-            "Desk 6.D14.1",
-            "Desk 6.D14.2",
-            "Desk 6.D14.3",
-            "Desk 6.D14.4",
-            "Desk 6.D14.5",
-            "Desk 6.D14.6",
-            "Desk 6.D14.7",
-            "Desk 6.D14.8",
-            "Desk 6.D15.1",
-            "Desk 6.D15.2",
-            "Desk 6.D15.3",
-            "Desk 6.D15.4",
-            "Desk 6.D15.5",
-            "Desk 6.D15.6",
-            "Desk 6.D15.7",
-            "Desk 6.D15.8"
-        ]
+        registry = get_registry()
 
-        
-        
-        NEIGHBOURHOODS = {
-            "Level 6": {
-                "A (Station)": level6_neighbourhood_a_station,
-                "A (City)": level6_neighbourhood_a_city,
-                "B (Station)": level6_neighbourhood_b_station,
-                "B (City)": level6_neighbourhood_b_city,
-                "C (Station)": level6_neighbourhood_c_station,
-                "D (Station)": level6_neighbourhood_d_station,
-                "D (City)": level6_neighbourhood_d_city,
-            }
-        }
-
-        
-        
         col1, col2 = st.columns(2)
 
         with col1:
-            selected_floor = st.selectbox("Select a floor:", list(NEIGHBOURHOODS.keys()), placeholder="Select a floor", label_visibility="hidden")
+            selected_floor = st.selectbox("Select a floor:", registry.floors(), placeholder="Select a floor", label_visibility="hidden")
         
         with col2:
-            selected_neighbourhood = st.selectbox("Select a neighbourhood:", list(NEIGHBOURHOODS[selected_floor].keys()), placeholder="Select a neighbourhood", label_visibility="hidden")
+            selected_neighbourhood = st.selectbox("Select a neighbourhood:", registry.neighbourhoods_on(selected_floor), placeholder="Select a neighbourhood", label_visibility="hidden")
 
         
-        st.warning("Only desks in Level 6 neighbourhoods are currently supported.")
+        st.info("Named neighbourhoods are configured in neighbourhoods.json. Other floors are listed, grouped by the letter in their desk names, once booking data has been fetched.")
         if st.button("Check Desk Availability"):
-            selected_desks = NEIGHBOURHOODS[selected_floor][selected_neighbourhood]
-            df = get_desk_availability(selected_desks, st.session_state['all_bookings'], start_date, end_date)
-            st.session_state['df'] = df  # Store the DataFrame in the session state
-
-            # Convert 'date' column to pandas Timestamp objects
-            df['date'] = pd.to_datetime(df['date'])
-
-            # Get all unique dates from the DataFrame
-            dates = df['date'].unique()
-
-            # Create an expander for each date and put the data for that date inside it
-            for date in dates:
-                # Convert the numpy.datetime64 object to a pandas.Timestamp object
-                date = pd.Timestamp(date)
-
-                with st.expander(f"{date.strftime('%Y-%m-%d')} ({len(df[(df['date'] == date) & (df['availability'] == 'Available')])} desks available)"):
-                    filtered_df = df[df['date'] == date]
-                    st.table(filtered_df)
+            st.session_state['availability_query'] = (selected_floor, selected_neighbourhood)
+
+        # Keep only the selection in session state; the availability table is cheap to rebuild
+        # from the desk index on each rerun, e.g. when an expander is opened
+        if 'availability_query' in st.session_state and 'all_bookings' in st.session_state:
+            selected_desks = registry.desks(*st.session_state['availability_query'])
+            df = get_desk_availability(selected_desks, st.session_state['all_bookings'], start_date, end_date, desk_index=st.session_state.get('desk_index'))
+
+            # Count the available desks and find each date's rows in one pass
+            available_counts = (df['availability'] == 'Available').groupby(df['date']).sum()
+            rows_by_date = df.groupby('date').indices
+
+            # Create an expander for each date; its table is only built while it is open
+            for date, rows in rows_by_date.items():
+                date_label = pd.Timestamp(date).strftime('%Y-%m-%d')
+                expander = st.expander(f"{date_label} ({available_counts[date]} desks available)", key=f"availability_{date_label}", on_change="rerun")
+                if expander.open:
+                    with expander:
+                        st.dataframe(df.iloc[rows], hide_index=True)
+
+        # Search the whole building for desks free across several days, using the half-day bitsets
+        if 'availability_index' in st.session_state:
+            st.header("Find me a desk")
+            availability_index = st.session_state['availability_index']
+            search_dates = st.multiselect("Days:", availability_index.dates, default=availability_index.dates)
+            col1, col2, col3 = st.columns(3)
+            with col1:
+                half_label = st.radio("Free for:", ["All day", "Morning", "Afternoon"])
+            with col2:
+                search_floor = st.selectbox("Floor:", ["Any floor"] + registry.floors(), key="search_floor")
+            with col3:
+                search_neighbourhood = st.selectbox("Neighbourhood:", ["Any neighbourhood"] + registry.neighbourhoods_on(search_floor), key="search_neighbourhood")
+            every_day = st.checkbox("Free on every selected day", value=True)
+            consecutive = None
+            if not every_day:
+                consecutive = st.number_input("Free for at least this many days in a row:", min_value=1, max_value=max(len(search_dates), 1), value=1,
+                                              help="Only adjacent days count as in a row; a weekend between two days is not a gap.")
+
+            if st.button("Find Desks"):
+                if search_neighbourhood != "Any neighbourhood":
+                    search_desks = registry.desks(search_floor, search_neighbourhood)
+                elif search_floor != "Any floor":
+                    search_desks = registry.floor_desks.get(search_floor, set())
+                else:
+                    search_desks = None
+                half = {"All day": 'both', "Morning": 'am', "Afternoon": 'pm'}[half_label]
+                free_desks = find_free_desks(availability_index, search_dates, half, search_desks, consecutive)
+                st.write(f"{len(free_desks)} desks found.")
+                st.dataframe(pd.DataFrame({
+                    'desk': free_desks,
+                    'floor': [registry.lookup(desk)[0] for desk in free_desks],
+                    'neighbourhood': [registry.lookup(desk)[1] for desk in free_desks],
+                }), hide_index=True)
     
 
-    with tab3:
+    with tab3, METRICS.timer('tab_render_seconds', tab="People Finder"):
         st.markdown("""
                     This tab allows you to select one or more colleagues and check their desk bookings for the selected date range.
 
@@ -598,8 +356,25 @@ def main():
             # Pass the selected start_date and end_date to your booking checking function
             check_desk_bookings(selected_team_members, st.session_state['all_bookings'], st, start_date, end_date)  # Use session state 
 
-
-    with tab4:
+        # Suggest free desks close to where the selected people are sitting, or banks with room for a group
+        if 'desk_clusters' in st.session_state:
+            st.header("Sit together")
+            seating_mode = st.radio("Find:", ["Free desks nearest the selected people", "Banks with enough free desks for a group"])
+            group_size = st.number_input("Number of desks:", min_value=1, max_value=20, value=max(len(selected_team_members), 1))
+
+            if st.button("Find Seats"):
+                availability_index = st.session_state['availability_index']
+                if seating_mode.startswith("Free desks"):
+                    seats_df = desks_near_people(st.session_state['desk_clusters'], availability_index, st.session_state['all_bookings'], selected_team_members, availability_index.dates, k=group_size)
+                else:
+                    seats_df = banks_with_free_desks(st.session_state['desk_clusters'], availability_index, availability_index.dates, k=group_size)
+                if seats_df.empty:
+                    st.write("No matching desks found.")
+                else:
+                    st.dataframe(seats_df, hide_index=True)
+
+
+    with tab4, METRICS.timer('tab_render_seconds', tab="Team Finder"):
         st.markdown("""
                     This tab allows you to upload a CSV file containing the names of team members. 
                     It will then display a table showing whether or not they're in the office on the selected dates.
@@ -610,7 +385,7 @@ def main():
         uploaded_file = st.file_uploader("Choose a CSV file", type="csv")
 
         st.info("""
-        * Each name in the CSV file must match the name of a person recorded in the Unity Place system. If the name is not an exact match, the desk will not be included in the results.
+        * Each name in the CSV file is matched against the names of people recorded in the Unity Place system. Case, accents, punctuation and the order of first and last names are ignored, and close spellings are matched unless turned off below.
         * The CSV file must contain a single column of names, with no header row. Each row must end with a comma. For example:
         ```
         Elon Musk,
@@ -619,20 +394,56 @@ def main():
         ```
         """)
 
+        accept_close_spellings = st.checkbox("Match close spellings", value=True)
+
         if uploaded_file is not None:
-            team_df = pd.read_csv(uploaded_file, skipinitialspace=True, header=None)
-            team_members = [name.strip(',').lower() for name in team_df.iloc[:, 0].tolist()]  # remove trailing commas and convert names to lowercase
-            
-            # Check if any of the team members have bookings
-            booked_team_members = set(team_members) & set([name.lower() for name in st.session_state['all_bookings'].keys()])  # convert names to lowercase before comparing
-            if booked_team_members:
+            team_members = read_team_file(uploaded_file)
+
+            # Resolve the roster against the name index, using the original name capitalization for display
+            resolved = st.session_state['name_index'].resolve(team_members, fuzzy=accept_close_spellings)
+            not_resolved = resolved[resolved['status'].isin(['ambiguous', 'unmatched'])]
+            if len(not_resolved):
+                st.warning(f"⚠️ {len(not_resolved)} name(s) could not be matched to a single person with a booking in the selected date range.")
+                st.dataframe(not_resolved[['name', 'status', 'candidates']], hide_index=True)
+            close_matches = resolved[resolved['status'] == 'fuzzy']
+            if len(close_matches):
+                st.caption("Matched by close spelling:")
+                st.dataframe(close_matches[['name', 'match', 'score']], hide_index=True)
+
+            original_names = matched_names(resolved)
+            if original_names:
                 st.subheader("Desk bookings specified team members:")
-                # Get original name capitalization from the session state for display
-                original_names = [name for name in st.session_state['all_bookings'].keys() if name.lower() in booked_team_members]
                 check_team_desk_bookings(original_names, st.session_state['all_bookings'], st, start_date, end_date)
             else:
                 st.write("None of the team members specified have desk bookings in the selected date range.")
 
+    if METRICS_PROM:
+        METRICS.write_prometheus(METRICS_PROM)
+
+
+# Show the recorded metrics in the sidebar, with downloads for the JSON and Prometheus exports
+def show_diagnostics():
+    snapshot = METRICS.snapshot()
+    timings = pd.DataFrame(snapshot['timings'], columns=['name', 'labels', 'count', 'sum', 'min', 'max', 'last'])
+    if len(timings):
+        timings['labels'] = timings['labels'].map(lambda labels: ", ".join(labels.values()))
+        timings['mean'] = timings['sum'] / timings['count']
+        st.caption("Timings (seconds)")
+        st.dataframe(timings[['name', 'labels', 'count', 'last', 'mean', 'max']], hide_index=True)
+    counters = pd.DataFrame(snapshot['counters'], columns=['name', 'labels', 'value'])
+    if len(counters):
+        counters['labels'] = counters['labels'].map(lambda labels: ", ".join(labels.values()))
+        st.caption("Counters")
+        st.dataframe(counters, hide_index=True)
+    if snapshot['requests']:
+        st.caption("Recent upstream requests")
+        st.dataframe(pd.DataFrame(snapshot['requests'][::-1]), hide_index=True)
+
+    st.download_button("Download metrics (JSON)", json.dumps(snapshot, indent=2), file_name="metrics.json", mime="application/json")
+    st.download_button("Download metrics (Prometheus)", METRICS.to_prometheus(), file_name="metrics.prom", mime="text/plain")
+    if st.button("Reset Metrics"):
+        METRICS.reset()
+
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
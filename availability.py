@@ -0,0 +1,111 @@
+import datetime
+
+import numpy as np
+
+from booking_table import MIDDAY, format_dates
+
+HALF_DAYS = ['both', 'am', 'pm']
+
+
+# Half-day occupancy bitsets for the whole building: for every fetched day, one packed
+# bit per desk for the morning and one for the afternoon (1 = occupied)
+class AvailabilityIndex:
+    def __init__(self, desks, dates, am_bits, pm_bits):
+        self.desks = desks
+        self.dates = dates
+        self.am_bits = am_bits
+        self.pm_bits = pm_bits
+        self.desk_positions = {desk: position for position, desk in enumerate(desks)}
+        self.date_positions = {current_date: position for position, current_date in enumerate(dates)}
+
+    # Packed mask selecting the given desks (all desks when None)
+    def desk_mask(self, desks=None):
+        selected = np.zeros(len(self.desks), dtype=bool)
+        if desks is None:
+            selected[:] = True
+        else:
+            selected[[self.desk_positions[desk] for desk in desks if desk in self.desk_positions]] = True
+        return np.packbits(selected)
+
+    # Packed mask of the desks occupied on a day in the given half ('am', 'pm' or 'both')
+    def occupied(self, current_date, half='both'):
+        position = self.date_positions[current_date]
+        if half == 'am':
+            return self.am_bits[position]
+        if half == 'pm':
+            return self.pm_bits[position]
+        return self.am_bits[position] | self.pm_bits[position]
+
+    def unpack(self, mask):
+        positions = np.flatnonzero(np.unpackbits(mask, count=len(self.desks)))
+        return [self.desks[position] for position in positions]
+
+
+# Function to build the availability index from the booking table, once per fetch.
+# Desks are every desk listed on a floor plus any desk with a booking.
+def build_availability_index(all_bookings, daily_desk_data_by_floor):
+    dates = sorted(daily_desk_data_by_floor)
+    desks = {desk for floors in daily_desk_data_by_floor.values() for floor in floors.values() for desk in floor.get('desks', ())}
+    desks.update(all_bookings['desk'].astype(str).unique())
+    desks = sorted(desks)
+    desk_positions = {desk: position for position, desk in enumerate(desks)}
+    date_positions = {current_date: position for position, current_date in enumerate(dates)}
+
+    am = np.zeros((len(dates), len(desks)), dtype=bool)
+    pm = np.zeros((len(dates), len(desks)), dtype=bool)
+    # A booking occupies the morning if it starts before midday and the afternoon if it ends after it
+    booking_dates = format_dates(all_bookings['date']).map(date_positions)
+    fetched = booking_dates.notna().to_numpy()
+    rows = booking_dates.to_numpy()[fetched].astype(int)
+    columns = all_bookings['desk'].astype(str).map(desk_positions).to_numpy()[fetched].astype(int)
+    morning = (all_bookings['startTime'] < MIDDAY).to_numpy()[fetched]
+    afternoon = (all_bookings['endTime'] > MIDDAY).to_numpy()[fetched]
+    am[rows[morning], columns[morning]] = True
+    pm[rows[afternoon], columns[afternoon]] = True
+
+    return AvailabilityIndex(desks, dates, np.packbits(am, axis=1), np.packbits(pm, axis=1))
+
+
+# Function to check whether two 'YYYY-MM-DD' dates follow each other, counting only a weekend
+# between them as no gap (a Friday and the next Monday are adjacent working days)
+def adjacent_days(previous_date, current_date):
+    previous = datetime.date.fromisoformat(previous_date)
+    gap = (datetime.date.fromisoformat(current_date) - previous).days
+    return gap >= 1 and all((previous + datetime.timedelta(days=i)).weekday() >= 5 for i in range(1, gap))
+
+
+# Function to split sorted dates into runs of adjacent days
+def day_runs(dates):
+    runs = []
+    for current_date in dates:
+        if runs and adjacent_days(runs[-1][-1], current_date):
+            runs[-1].append(current_date)
+        else:
+            runs.append([current_date])
+    return runs
+
+
+# Function to find desks that are free in the given half of every one of the given dates,
+# or, with consecutive=n, free for at least n adjacent days in a row among the given dates
+# (a gap in the dates, other than a weekend, ends a run)
+def find_free_desks(index, dates, half='both', desks=None, consecutive=None):
+    dates = sorted(current_date for current_date in set(dates) if current_date in index.date_positions)
+    candidates = index.desk_mask(desks)
+    if not dates:
+        return []
+
+    if consecutive is None:
+        for current_date in dates:
+            candidates &= ~index.occupied(current_date, half)
+        return index.unpack(candidates)
+
+    # Slide a window of `consecutive` days along each run, keeping desks free for any whole window
+    found = np.zeros_like(candidates)
+    for run in day_runs(dates):
+        free_days = [~index.occupied(current_date, half) for current_date in run]
+        for start in range(len(run) - consecutive + 1):
+            window = candidates.copy()
+            for free in free_days[start:start + consecutive]:
+                window &= free
+            found |= window
+    return index.unpack(found)
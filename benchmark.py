@@ -0,0 +1,237 @@
+import argparse
+import datetime
+import io
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from unittest import mock
+from urllib.parse import parse_qs
+
+import pandas as pd
+import requests
+from requests.adapters import BaseAdapter, HTTPAdapter
+from urllib3.response import HTTPResponse
+
+import desk_booking
+from data_io import load_bookings, save_day
+from desk_booking import (GET_DESKS_URL, build_headers,
+                          check_team_desk_bookings, get_all_desk_bookings,
+                          get_desk_availability)
+from fetch_scheduler import WindowTuner
+
+# Benchmarks for the hot paths, run against synthetic GetDesks responses with HTTP mocked.
+# Each run appends one JSON line to the results file, so runs can be compared across versions:
+#   python benchmark.py --floors 8 --desks 120 --occupancy 0.6 --days 10
+
+DEFAULT_FLOORS = 6
+DEFAULT_DESKS_PER_FLOOR = 120
+DEFAULT_OCCUPANCY = 0.6
+DEFAULT_DAYS = 5
+DEFAULT_REPEAT = 5
+DEFAULT_RESULTS_FILE = "benchmark_results.jsonl"
+
+# Desks are laid out in neighbourhoods of 8 banks of 8 seats, as in "Desk 6.A07.3"
+SEATS_PER_BANK = 8
+BANKS_PER_NEIGHBOURHOOD = 8
+
+FIRST_NAMES = ["Alex", "Sam", "Priya", "Chen", "Fatima", "Liam", "Olivia", "Noah", "Aisha", "Mateo", "Sofia", "Yusuf", "Grace", "Ravi", "Zoë", "Tom"]
+LAST_NAMES = ["Smith", "Patel", "Jones", "Nguyen", "Khan", "Brown", "García", "Williams", "O'Brien", "Taylor", "Müller", "Davies", "Ali", "Evans"]
+
+
+# Function to name the nth desk on a floor
+def synthetic_desk_name(level, position):
+    neighbourhood, rest = divmod(position, SEATS_PER_BANK * BANKS_PER_NEIGHBOURHOOD)
+    bank, seat = divmod(rest, SEATS_PER_BANK)
+    return f"Desk {level}.{chr(ord('A') + neighbourhood)}{bank + 1:02d}.{seat + 1}"
+
+
+# Function to make a pool of distinct people's names
+def synthetic_people(count, seed=0):
+    rnd = random.Random(seed)
+    names = [f"{first} {last}" for first in FIRST_NAMES for last in LAST_NAMES]
+    rnd.shuffle(names)
+    return [names[position % len(names)] + (f" {position // len(names) + 1}" if position >= len(names) else "") for position in range(count)]
+
+
+# Function to make one desk's time slots for a day: all day, morning, afternoon or both halves.
+# Times are bare 'HH:MM:SS', as the API sends them, unless dated is set.
+def _day_slots(current_date, rnd, occupancy, people, dated=False):
+    prefix = f"{current_date}T" if dated else ""
+
+    def slot(start, end, user):
+        return {
+            "startTime": f"{prefix}{start}",
+            "endTime": f"{prefix}{end}",
+            "availability": "Booked" if user else "Available",
+            "user": {"name": user} if user else None,
+        }
+
+    if rnd.random() >= occupancy:
+        return [slot("00:00:00", "23:59:00", None)]
+    kind = rnd.random()
+    if kind < 0.6:
+        return [slot("00:00:00", "23:59:00", rnd.choice(people))]
+    if kind < 0.8:
+        return [slot("08:00:00", "13:00:00", rnd.choice(people)), slot("13:00:00", "23:59:00", None)]
+    if kind < 0.95:
+        return [slot("00:00:00", "13:00:00", None), slot("13:00:00", "18:00:00", rnd.choice(people))]
+    return [slot("08:00:00", "13:00:00", rnd.choice(people)), slot("13:00:00", "18:00:00", rnd.choice(people))]
+
+
+# Function to generate a GetDesks response covering the given 'YYYY-MM-DD' dates. Each desk-day
+# is generated from its own seed, so a day looks the same whichever window it is requested in.
+# Slot times carry no date, as in the real API, so multi-day windows cannot be split and the
+# fetch falls back to one request per day; dated_slots adds dates to time the windowed path.
+def make_get_desks_payload(dates, floors=DEFAULT_FLOORS, desks_per_floor=DEFAULT_DESKS_PER_FLOOR, occupancy=DEFAULT_OCCUPANCY, seed=0, dated_slots=False):
+    people = synthetic_people(int(floors * desks_per_floor * 1.5), seed)
+    floor_list = []
+    for level in range(1, floors + 1):
+        desks = []
+        for position in range(desks_per_floor):
+            desk_name = synthetic_desk_name(level, position)
+            slots = []
+            for current_date in dates:
+                slots.extend(_day_slots(current_date, random.Random(f"{seed}-{current_date}-{desk_name}"), occupancy, people, dated_slots))
+            desks.append({"id": f"{level}-{position}", "name": desk_name, "timeSlots": slots})
+        floor_list.append({"floorName": f"Level {level}", "desks": desks})
+    return {"floors": floor_list}
+
+
+# Transport adapter answering GetDesks requests with synthetic responses, encoded once per window
+class SyntheticAdapter(BaseAdapter):
+    def __init__(self, **scale):
+        super().__init__()
+        self.scale = scale
+        self._bodies = {}
+        self._responses = HTTPAdapter()
+
+    def send(self, request, **kwargs):
+        form = parse_qs(request.body if isinstance(request.body, str) else request.body.decode())
+        start = datetime.date.fromisoformat(form["startDate"][0][:10])
+        end = datetime.date.fromisoformat(form["endDate"][0][:10])
+        key = (start, end)
+        if key not in self._bodies:
+            dates = [(start + datetime.timedelta(days=i)).strftime('%Y-%m-%d') for i in range((end - start).days + 1)]
+            self._bodies[key] = json.dumps(make_get_desks_payload(dates, **self.scale)).encode()
+        raw = HTTPResponse(body=io.BytesIO(self._bodies[key]), status=200, headers={"Content-Type": "application/json"}, preload_content=False)
+        return self._responses.build_response(request, raw)
+
+    def close(self):
+        pass
+
+
+# Function to make a create_session replacement that routes every request to the adapter
+def synthetic_sessions(adapter):
+    def create_session(max_workers=desk_booking.DEFAULT_MAX_WORKERS):
+        session = requests.Session()
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        return session
+    return create_session
+
+
+# Stands in for the streamlit module when timing functions that render tables
+class NullRenderer:
+    def subheader(self, *args, **kwargs):
+        pass
+
+    def table(self, *args, **kwargs):
+        pass
+
+
+# Function to time a call, after one untimed warm-up run
+def time_call(fn, repeat=DEFAULT_REPEAT):
+    fn()
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - started)
+    return {
+        'min': min(timings),
+        'median': statistics.median(timings),
+        'mean': statistics.fmean(timings),
+        'repeat': repeat,
+    }
+
+
+# Function to record the commit being benchmarked, if run from a git checkout
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+# Function to run every benchmark at one scale, returning the results record
+def run_benchmarks(floors=DEFAULT_FLOORS, desks_per_floor=DEFAULT_DESKS_PER_FLOOR, occupancy=DEFAULT_OCCUPANCY, days=DEFAULT_DAYS, repeat=DEFAULT_REPEAT, seed=0, dated_slots=False):
+    start_date = datetime.date(2024, 1, 1)
+    end_date = start_date + datetime.timedelta(days=days - 1)
+    headers = build_headers("benchmark")
+    adapter = SyntheticAdapter(floors=floors, desks_per_floor=desks_per_floor, occupancy=occupancy, seed=seed, dated_slots=dated_slots)
+    results = {}
+
+    tuner = WindowTuner()  # shared across runs as in the app, so the warm-up learns the window size
+    with mock.patch.object(desk_booking, "create_session", synthetic_sessions(adapter)):
+        def fetch():
+            return get_all_desk_bookings(GET_DESKS_URL, headers, start_date, end_date, tuner=tuner)
+        results['get_all_desk_bookings'] = time_call(fetch, repeat)
+        all_bookings, all_team_members, _, daily_desk_data_by_floor, _ = fetch()
+
+    neighbourhood_desks = [synthetic_desk_name(1, position) for position in range(min(desks_per_floor, SEATS_PER_BANK * BANKS_PER_NEIGHBOURHOOD))]
+    results['get_desk_availability'] = time_call(lambda: get_desk_availability(neighbourhood_desks, all_bookings, start_date, end_date), repeat)
+
+    team = random.Random(seed).sample(all_team_members, min(50, len(all_team_members)))
+    results['check_team_desk_bookings'] = time_call(lambda: check_team_desk_bookings(team, all_bookings, NullRenderer(), start_date, end_date), repeat)
+
+    day_groups = {current_date: all_bookings[all_bookings['date'] == pd.Timestamp(current_date)] for current_date in daily_desk_data_by_floor}
+    with tempfile.TemporaryDirectory() as directory:
+        filename = os.path.join(directory, "benchmark.db")
+
+        def round_trip():
+            for current_date, day_floors in daily_desk_data_by_floor.items():
+                save_day(current_date, day_groups[current_date], day_floors, filename)
+            return load_bookings(start_date, end_date, filename)
+        results['data_io_round_trip'] = time_call(round_trip, repeat)
+
+    return {
+        'timestamp': datetime.datetime.now().isoformat(timespec='seconds'),
+        'commit': git_commit(),
+        'python': platform.python_version(),
+        'pandas': pd.__version__,
+        'scale': {'floors': floors, 'desks_per_floor': desks_per_floor, 'occupancy': occupancy, 'days': days, 'seed': seed, 'dated_slots': dated_slots},
+        'bookings': len(all_bookings),
+        'results': results,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the booking hot paths against synthetic GetDesks data.")
+    parser.add_argument("--floors", type=int, default=DEFAULT_FLOORS)
+    parser.add_argument("--desks", type=int, default=DEFAULT_DESKS_PER_FLOOR, help="desks per floor")
+    parser.add_argument("--occupancy", type=float, default=DEFAULT_OCCUPANCY, help="share of desks booked each day (0-1)")
+    parser.add_argument("--days", type=int, default=DEFAULT_DAYS)
+    parser.add_argument("--repeat", type=int, default=DEFAULT_REPEAT, help="timed runs per benchmark")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--dated-slots", action="store_true", help="put dates in slot times, so multi-day windows are fetched (the real API sends bare times)")
+    parser.add_argument("--output", default=DEFAULT_RESULTS_FILE, help=f"file to append results to (default: {DEFAULT_RESULTS_FILE})")
+    args = parser.parse_args(argv)
+
+    record = run_benchmarks(args.floors, args.desks, args.occupancy, args.days, args.repeat, args.seed, args.dated_slots)
+    with open(args.output, "a") as f:
+        f.write(json.dumps(record) + "\n")
+
+    print(f"{record['bookings']} bookings over {args.days} days, {args.floors} floors x {args.desks} desks")
+    for name, timing in record['results'].items():
+        print(f"{name:<28} min {timing['min'] * 1000:9.1f} ms   median {timing['median'] * 1000:9.1f} ms")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
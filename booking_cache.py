@@ -0,0 +1,264 @@
+import datetime
+import hashlib
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+# How long a cached day stays fresh, in seconds. Today and future days are still
+# being booked so they expire quickly; past days rarely change.
+SHORT_TTL = 5 * 60
+LONG_TTL = 24 * 60 * 60
+
+# How long a token stays authorised to read the shared cache after a successful
+# upstream call made with it, in seconds
+AUTH_TTL = 30 * 60
+
+# How long to wait for another caller's in-flight fetch of the same day, in seconds
+IN_FLIGHT_TIMEOUT = 120
+
+# Default memory budget for all cached entries, in bytes. Least recently used entries
+# (expired ones first) are evicted once the cached data grows beyond it.
+MEMORY_BUDGET = 512 * 1024 * 1024
+
+
+# Function to work out the TTL for a given 'YYYY-MM-DD' date
+def day_ttl(current_date, short_ttl=SHORT_TTL, long_ttl=LONG_TTL):
+    if current_date < datetime.date.today().strftime('%Y-%m-%d'):
+        return long_ttl
+    return short_ttl
+
+
+# Function to build the cache scope for a building. Cached days are shared by everyone
+# looking at the same building; access is checked per token with is_authorised.
+def building_scope(url, building_id=""):
+    return url, building_id
+
+
+# Function to estimate the memory held by a cached value, in bytes. pandas and numpy objects
+# report their own (deep) size; containers and plain objects are walked, counting each object once.
+def estimate_nbytes(value, seen=None):
+    seen = set() if seen is None else seen
+    if id(value) in seen:
+        return 0
+    seen.add(id(value))
+    if isinstance(value, (pd.DataFrame, pd.Series, pd.Index)):
+        return int(np.sum(value.memory_usage(deep=True)))
+    if isinstance(value, np.ndarray):
+        return value.nbytes
+    size = sys.getsizeof(value)
+    if isinstance(value, dict):
+        return size + sum(estimate_nbytes(key, seen) + estimate_nbytes(item, seen) for key, item in value.items())
+    if isinstance(value, (list, tuple, set, frozenset)):
+        return size + sum(estimate_nbytes(item, seen) for item in value)
+    if hasattr(value, '__dict__') and not isinstance(value, type):
+        return size + estimate_nbytes(vars(value), seen)
+    return size
+
+
+# Function to fingerprint the bearer token in a request's headers
+def token_fingerprint(headers):
+    token = headers.get("Authorization", "")
+    return hashlib.sha256(token.encode()).hexdigest()
+
+
+# Thread-safe cache of parsed booking data, one entry per building-day, shared across
+# sessions. Concurrent fetches of the same day are coalesced with claim/release.
+# Expired days are kept until replaced, invalidated or evicted, as the base for the next
+# re-fetch. Each entry's size is estimated when it is stored, and the least recently used
+# entries are evicted to keep the total within the memory budget. Assembled date ranges
+# (everything the app derives from a fetch) can be cached too, with get_range/put_range.
+class DayCache:
+    def __init__(self, short_ttl=SHORT_TTL, long_ttl=LONG_TTL, auth_ttl=AUTH_TTL, memory_budget=MEMORY_BUDGET):
+        self.short_ttl = short_ttl
+        self.long_ttl = long_ttl
+        self.auth_ttl = auth_ttl
+        self.memory_budget = memory_budget
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()  # (scope, date or range) -> (expires_at, value, validators, nbytes), least recently used first
+        self._nbytes = 0
+        self._in_flight = {}
+        self._authorised = {}
+        self._auth_errors = {}
+        self._lock = threading.Lock()
+
+    def get(self, scope, current_date):
+        with self._lock:
+            entry = self._entries.get((scope, current_date))
+            if entry is None or entry[0] <= time.monotonic():
+                self.misses += 1
+                return None
+            self._entries.move_to_end((scope, current_date))
+            self.hits += 1
+            return entry[1]
+
+    # Returns a day and its response validators even if it has expired, so a re-fetch
+    # can be made conditional and reuse the floors that have not changed
+    def get_stale(self, scope, current_date):
+        with self._lock:
+            entry = self._entries.get((scope, current_date))
+        if entry is None:
+            return None, None
+        return entry[1], entry[2]
+
+    # Stores a day, with the ETag / Last-Modified validators of its response if there were any.
+    # Claims on the day are left alone: only their owner ends them, with release.
+    def put(self, scope, current_date, value, validators=None):
+        self._store((scope, current_date), day_ttl(current_date, self.short_ttl, self.long_ttl), value, validators)
+
+    # Returns the cached data assembled for a range of 'YYYY-MM-DD' dates, if still fresh
+    def get_range(self, scope, start_date, end_date):
+        return self.get(scope, ('range', start_date, end_date))
+
+    # Stores the data assembled for a range. It expires with the range's last day.
+    def put_range(self, scope, start_date, end_date, value):
+        self._store((scope, ('range', start_date, end_date)), day_ttl(end_date, self.short_ttl, self.long_ttl), value)
+
+    def _store(self, key, ttl, value, validators=None):
+        nbytes = estimate_nbytes(value)
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._nbytes -= previous[3]
+            self._entries[key] = (time.monotonic() + ttl, value, validators, nbytes)
+            self._nbytes += nbytes
+            self._evict()
+
+    # Evicts expired entries, then the least recently used, until the cache fits its budget.
+    # The entry just stored is always kept. Called with the lock held.
+    def _evict(self):
+        if self._nbytes <= self.memory_budget:
+            return
+        now = time.monotonic()
+        candidates = [key for key, entry in self._entries.items() if entry[0] <= now] + list(self._entries)
+        newest = next(reversed(self._entries))
+        for key in candidates:
+            if self._nbytes <= self.memory_budget:
+                break
+            if key == newest or key not in self._entries:
+                continue
+            self._nbytes -= self._entries.pop(key)[3]
+            self.evictions += 1
+
+    # Summarises the cache's size and activity
+    def footprint(self):
+        now = time.monotonic()
+        with self._lock:
+            return {
+                'days': sum(1 for key in self._entries if isinstance(key[1], str)),
+                'ranges': sum(1 for key in self._entries if not isinstance(key[1], str)),
+                'expired': sum(1 for entry in self._entries.values() if entry[0] <= now),
+                'bytes': self._nbytes,
+                'budget': self.memory_budget,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+            }
+
+    # Lists the cached entries, most recently used first, with their size and time left
+    def report(self):
+        now = time.monotonic()
+        with self._lock:
+            entries = list(self._entries.items())
+        return [
+            {
+                'entry': key[1] if isinstance(key[1], str) else f"{key[1][1]} to {key[1][2]}",
+                'kind': 'day' if isinstance(key[1], str) else 'range',
+                'bytes': entry[3],
+                'expires_in': max(0, round(entry[0] - now)),
+            }
+            for key, entry in reversed(entries)
+        ]
+
+    # Claims the dates this caller should fetch. Dates another caller is already fetching
+    # are returned with an Event that is set once that fetch has finished.
+    def claim(self, scope, dates):
+        owned, waiting = [], {}
+        with self._lock:
+            for current_date in dates:
+                event = self._in_flight.get((scope, current_date))
+                if event is None:
+                    self._in_flight[(scope, current_date)] = threading.Event()
+                    owned.append(current_date)
+                else:
+                    waiting[current_date] = event
+        return owned, waiting
+
+    # Ends a claim, waking any callers waiting on it
+    def release(self, scope, current_date):
+        with self._lock:
+            event = self._in_flight.pop((scope, current_date), None)
+        if event is not None:
+            event.set()
+
+    # Records that a token has just been accepted by the API
+    def authorise(self, headers):
+        with self._lock:
+            self._authorised[token_fingerprint(headers)] = time.monotonic() + self.auth_ttl
+            self._auth_errors.pop(token_fingerprint(headers), None)
+
+    # Claims the upstream check of a token, so concurrent callers with the same token make
+    # one check between them. Returns None if this caller should make the check, or an
+    # Event that is set once another caller's check has finished.
+    def claim_authorisation(self, headers):
+        key = ('authorisation', token_fingerprint(headers))
+        with self._lock:
+            event = self._in_flight.get(key)
+            if event is None:
+                self._in_flight[key] = threading.Event()
+                self._auth_errors.pop(token_fingerprint(headers), None)
+            return event
+
+    # Ends a token check, recording the token as accepted or the error it was rejected with,
+    # and wakes any callers waiting on it
+    def release_authorisation(self, headers, error=None):
+        if error is None:
+            self.authorise(headers)
+        else:
+            with self._lock:
+                self._auth_errors[token_fingerprint(headers)] = error
+        with self._lock:
+            event = self._in_flight.pop(('authorisation', token_fingerprint(headers)), None)
+        if event is not None:
+            event.set()
+
+    # Returns the error the last check of a token failed with, if it failed
+    def authorisation_error(self, headers):
+        with self._lock:
+            return self._auth_errors.get(token_fingerprint(headers))
+
+    # Checks whether a token was accepted by the API recently enough to read cached days
+    def is_authorised(self, headers):
+        with self._lock:
+            expires_at = self._authorised.get(token_fingerprint(headers))
+        return expires_at is not None and expires_at > time.monotonic()
+
+    # Drops a single day and the ranges covering it (for every scope) or, when no date is
+    # given, everything
+    def invalidate(self, current_date=None):
+        with self._lock:
+            if current_date is None:
+                self._entries.clear()
+                self._nbytes = 0
+            else:
+                for key in [key for key in self._entries if _covers(key[1], current_date)]:
+                    self._nbytes -= self._entries.pop(key)[3]
+
+    def clear(self):
+        self.invalidate()
+
+    def dates(self):
+        with self._lock:
+            return sorted({key[1] for key in self._entries if isinstance(key[1], str)})
+
+
+# Function to check whether a cache key (a date or a range) covers a date
+def _covers(entry, current_date):
+    if isinstance(entry, str):
+        return entry == current_date
+    return entry[1] <= current_date <= entry[2]
@@ -0,0 +1,74 @@
+import numpy as np
+import pandas as pd
+
+# Columnar booking model: one row per booked time slot, shared by every query
+BOOKING_COLUMNS = ['date', 'floor', 'desk', 'name', 'startTime', 'endTime', 'availability', 'half', 'period']
+CATEGORICAL_COLUMNS = ['floor', 'desk', 'name', 'availability', 'half', 'period']
+RAW_COLUMNS = ['date', 'floor', 'desk', 'name', 'startTime', 'endTime', 'availability']
+
+START_OF_DAY = pd.Timedelta(0)
+MIDDAY = pd.Timedelta(hours=13)
+END_OF_DAY = pd.Timedelta(hours=23, minutes=59)
+
+
+# Function to build a typed booking table from raw column values (strings as returned by the API)
+def bookings_frame(columns):
+    df = pd.DataFrame({
+        'date': pd.to_datetime(pd.Series(columns['date'], dtype=object), format='%Y-%m-%d'),
+        'floor': columns['floor'],
+        'desk': columns['desk'],
+        'name': columns['name'],
+        'startTime': pd.to_timedelta(pd.Series(columns['startTime'], dtype=object)),
+        'endTime': pd.to_timedelta(pd.Series(columns['endTime'], dtype=object)),
+        'availability': columns['availability'],
+    })
+    df['half'], df['period'] = classify_slots(df['startTime'], df['endTime'])
+    return _categorize(df)
+
+
+# Function to classify booked slots once at ingest. 'half' is the part of the day a slot
+# counts towards for occupancy; 'period' is the booking period shown by the finders.
+def classify_slots(start_times, end_times):
+    half = np.where(start_times < MIDDAY, 'AM', 'PM')
+
+    all_day = (start_times <= START_OF_DAY) & (end_times >= END_OF_DAY)
+    morning = ~all_day & (end_times <= MIDDAY)
+    afternoon = ~all_day & ~morning & (start_times >= MIDDAY)
+    period = np.select([all_day, morning, afternoon], ["All Day", "Morning Only", "Afternoon Only"], default="")
+    return half, period
+
+
+# Function to create an empty booking table
+def empty_bookings():
+    return bookings_frame({column: [] for column in RAW_COLUMNS})
+
+
+# Function to concatenate per-day booking tables into one table with shared categories
+def concat_bookings(frames):
+    frames = [frame for frame in frames if len(frame)]
+    if not frames:
+        return empty_bookings()
+    df = pd.concat(frames, ignore_index=True)
+    return _categorize(df)
+
+
+def _categorize(df):
+    for column in CATEGORICAL_COLUMNS:
+        if not isinstance(df[column].dtype, pd.CategoricalDtype):
+            df[column] = df[column].astype('category')
+    return df[BOOKING_COLUMNS]
+
+
+# Function to render a date column as 'YYYY-MM-DD' strings
+def format_dates(dates):
+    return dates.dt.strftime('%Y-%m-%d')
+
+
+# Function to render a time-of-day (timedelta) column as 'HH:MM:SS' strings
+def format_times(times):
+    return (pd.Timestamp(0) + times).dt.strftime('%H:%M:%S')
+
+
+# Function to list the people with at least one booking in the table
+def booked_names(bookings):
+    return sorted(bookings['name'].unique().tolist())
@@ -0,0 +1,125 @@
+import argparse
+import datetime
+import os
+import sys
+
+from data_io import save_day
+from desk_booking import (GET_DESKS_URL, attendance_matrix, build_headers,
+                          build_occupancy_matrix,
+                          get_all_desk_bookings, get_desk_availability,
+                          get_person_bookings, occupancy_frame,
+                          read_team_file)
+from history import record_days
+from metrics import METRICS
+from name_index import NameIndex, matched_names
+from neighbourhoods import load_registry
+
+# Headless batch entry point for scheduled exports, e.g. from cron:
+#   UP_API_TOKEN=... python cli.py --start 2023-10-02 --end 2023-10-06 --team-file team.csv --format csv
+
+REPORT_FORMATS = ['csv', 'parquet', 'json']
+
+
+# Function to parse the command-line arguments
+def parse_args(argv=None):
+    today = datetime.date.today()
+    parser = argparse.ArgumentParser(description="Export Unity Place desk booking reports without the Streamlit app.")
+    parser.add_argument("--token", default=os.environ.get("UP_API_TOKEN"), help="API token (defaults to the UP_API_TOKEN environment variable)")
+    parser.add_argument("--url", default=GET_DESKS_URL, help="GetDesks API URL")
+    parser.add_argument("--start", type=datetime.date.fromisoformat, default=today, help="first date, YYYY-MM-DD (default: today)")
+    parser.add_argument("--end", type=datetime.date.fromisoformat, default=None, help="last date, YYYY-MM-DD (default: start + 4 days)")
+    parser.add_argument("--people", nargs="*", default=[], help="names to report individual bookings for")
+    parser.add_argument("--team-file", help="CSV of team member names, in the Team Finder format")
+    parser.add_argument("--desks-file", help="text file of desk names, one per line, to report availability for")
+    parser.add_argument("--neighbourhood", nargs=2, metavar=("FLOOR", "NEIGHBOURHOOD"), help='neighbourhood to report availability for, e.g. "Level 6" "A (Station)"')
+    parser.add_argument("--output-dir", default="reports", help="directory to write reports to (default: reports)")
+    parser.add_argument("--format", choices=REPORT_FORMATS, default="csv", help="report format (default: csv)")
+    parser.add_argument("--snapshot", action="store_true", help="also append fetched days to the local snapshot store")
+    parser.add_argument("--history", action="store_true", help="also add the per-floor desk counts of fetched days before today to the occupancy history")
+    parser.add_argument("--metrics-log", help="append fetch and parse timings to this JSON lines file")
+    parser.add_argument("--metrics-prom", help="write fetch and parse timings to this Prometheus text file")
+    args = parser.parse_args(argv)
+
+    if not args.token:
+        parser.error("an API token is required: pass --token or set UP_API_TOKEN")
+    if args.end is None:
+        args.end = args.start + datetime.timedelta(days=4)
+    if args.end < args.start:
+        parser.error("--end must not be before --start")
+    return args
+
+
+# Function to write one report in the chosen format, returning its path
+def write_report(df, output_dir, name, report_format):
+    path = os.path.join(output_dir, f"{name}.{report_format}")
+    if 'date' in df and hasattr(df['date'], 'dt'):
+        df = df.assign(date=df['date'].dt.strftime('%Y-%m-%d'))
+    if report_format == 'csv':
+        df.to_csv(path, index=False)
+    elif report_format == 'parquet':
+        df.to_parquet(path, index=False)
+    else:
+        df.to_json(path, orient='records', indent=2)
+    return path
+
+
+# Function to read desk names from a text file, one per line
+def read_desks_file(filename):
+    with open(filename) as f:
+        return [line.strip() for line in f if line.strip()]
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    headers = build_headers(args.token)
+
+    all_bookings, all_team_members, daily_desk_data, daily_desk_data_by_floor, fetch_errors = get_all_desk_bookings(
+        args.url, headers, args.start, args.end, on_day_fetched=save_day if args.snapshot else None)
+    for current_date, error in sorted(fetch_errors.items()):
+        print(f"warning: {current_date} could not be fetched ({error})", file=sys.stderr)
+    if not daily_desk_data_by_floor:
+        print("error: no booking data could be fetched", file=sys.stderr)
+        return 1
+
+    if args.history:
+        record_days(daily_desk_data_by_floor)
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    reports = {'occupancy': occupancy_frame(build_occupancy_matrix(daily_desk_data_by_floor))}
+
+    if args.people:
+        reports['people'] = get_person_bookings(args.people, all_bookings, args.start, args.end)
+        reports['attendance'] = attendance_matrix(args.people, all_bookings, args.start, args.end).reset_index()
+
+    if args.team_file:
+        resolved = NameIndex(all_team_members).resolve(read_team_file(args.team_file))
+        for row in resolved[resolved['status'].isin(['ambiguous', 'unmatched'])].itertuples():
+            print(f"warning: {row.name} is {row.status}" + (f" ({row.candidates})" if row.candidates else ""), file=sys.stderr)
+        team_members = matched_names(resolved)
+        reports['team'] = get_person_bookings(team_members, all_bookings, args.start, args.end)
+
+    desk_names = read_desks_file(args.desks_file) if args.desks_file else []
+    if args.neighbourhood:
+        registry = load_registry()
+        for floors in daily_desk_data_by_floor.values():
+            registry.add_floors(floors)
+        neighbourhood_desks = registry.desks(*args.neighbourhood)
+        if not neighbourhood_desks:
+            print(f"error: unknown neighbourhood {args.neighbourhood[1]!r} on {args.neighbourhood[0]!r}", file=sys.stderr)
+            return 1
+        desk_names += [desk for desk in neighbourhood_desks if desk not in desk_names]
+    if desk_names:
+        reports['availability'] = get_desk_availability(desk_names, all_bookings, args.start, args.end)
+
+    for name, df in reports.items():
+        print(write_report(df, args.output_dir, name, args.format))
+
+    if args.metrics_log:
+        METRICS.write_json_log(args.metrics_log)
+    if args.metrics_prom:
+        METRICS.write_prometheus(args.metrics_prom)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
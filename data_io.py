@@ -1,34 +1,120 @@
-import pandas as pd
 import os
+import sqlite3
+
+import pandas as pd
+
+from booking_table import (booked_names, bookings_frame, empty_bookings,
+                           format_dates, format_times)
+
+# Local snapshot store for fetched booking data
+DEFAULT_DB = "bookings.db"
+
+STORED_COLUMNS = ['date', 'floor', 'desk', 'name', 'startTime', 'endTime', 'availability']
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS bookings (
+    date TEXT NOT NULL,
+    floor TEXT NOT NULL,
+    desk TEXT NOT NULL,
+    name TEXT NOT NULL,
+    startTime TEXT NOT NULL,
+    endTime TEXT NOT NULL,
+    availability TEXT,
+    PRIMARY KEY (date, floor, desk, name, startTime)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS floors (
+    date TEXT NOT NULL,
+    floor TEXT NOT NULL,
+    total_desks INTEGER NOT NULL,
+    booked_desks_am INTEGER NOT NULL,
+    booked_desks_pm INTEGER NOT NULL,
+    PRIMARY KEY (date, floor)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS desks (
+    date TEXT NOT NULL,
+    floor TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    desk TEXT NOT NULL,
+    PRIMARY KEY (date, floor, position)
+) WITHOUT ROWID;
+
+CREATE INDEX IF NOT EXISTS bookings_by_name ON bookings (name, date);
+"""
+
+
+# Function to open the snapshot store, creating the tables if needed
+def connect(filename=DEFAULT_DB):
+    conn = sqlite3.connect(filename)
+    conn.executescript(SCHEMA)
+    return conn
+
+
+# Function to append (or replace) one fetched day in the snapshot store
+def save_day(current_date, day_bookings, day_floors, filename=DEFAULT_DB):
+    booking_rows = pd.DataFrame({
+        'date': format_dates(day_bookings['date']),
+        'floor': day_bookings['floor'].astype(str),
+        'desk': day_bookings['desk'].astype(str),
+        'name': day_bookings['name'].astype(str),
+        'startTime': format_times(day_bookings['startTime']),
+        'endTime': format_times(day_bookings['endTime']),
+        'availability': day_bookings['availability'].astype(str),
+    })
+    floor_rows = [
+        (current_date, floor, counts['total_desks'], counts['booked_desks_am'], counts['booked_desks_pm'])
+        for floor, counts in day_floors.items()
+    ]
+    # Every desk on each floor, booked or not, so free desks can be found in a loaded snapshot
+    desk_rows = [
+        (current_date, floor, position, desk)
+        for floor, counts in day_floors.items()
+        for position, desk in enumerate(counts.get('desks', ()))
+    ]
+
+    with connect(filename) as conn:
+        conn.execute("DELETE FROM bookings WHERE date = ?", (current_date,))
+        conn.execute("DELETE FROM floors WHERE date = ?", (current_date,))
+        conn.execute("DELETE FROM desks WHERE date = ?", (current_date,))
+        conn.executemany("INSERT OR REPLACE INTO bookings VALUES (?, ?, ?, ?, ?, ?, ?)", booking_rows.itertuples(index=False, name=None))
+        conn.executemany("INSERT OR REPLACE INTO floors VALUES (?, ?, ?, ?, ?)", floor_rows)
+        conn.executemany("INSERT OR REPLACE INTO desks VALUES (?, ?, ?, ?)", desk_rows)
+    conn.close()
+
+
+# Function to build the WHERE clause limiting a query to a date range
+def _date_filter(start_date, end_date):
+    clauses, params = [], []
+    if start_date is not None:
+        clauses.append("date >= ?")
+        params.append(str(start_date))
+    if end_date is not None:
+        clauses.append("date <= ?")
+        params.append(str(end_date))
+    return (" WHERE " + " AND ".join(clauses) if clauses else ""), params
+
+
+# Function to load stored bookings for a date range, in the same shape returned by get_all_desk_bookings
+def load_bookings(start_date=None, end_date=None, filename=DEFAULT_DB):
+    if not os.path.exists(filename):
+        return empty_bookings(), [], {}, {}
+
+    where, params = _date_filter(start_date, end_date)
+    with connect(filename) as conn:
+        bookings_df = pd.read_sql_query(f"SELECT {', '.join(STORED_COLUMNS)} FROM bookings{where} ORDER BY date", conn, params=params)
+        floors_df = pd.read_sql_query(f"SELECT * FROM floors{where} ORDER BY date, floor", conn, params=params)
+        desks_df = pd.read_sql_query(f"SELECT date, floor, desk FROM desks{where} ORDER BY date, floor, position", conn, params=params)
+    conn.close()
+
+    all_bookings = bookings_frame(bookings_df)
+    desks_by_floor = {key: tuple(group) for key, group in desks_df.groupby(['date', 'floor'], sort=False)['desk']}
+
+    daily_desk_data_by_floor = {}
+    for current_date, group in floors_df.groupby('date', sort=True):
+        day_floors = group.set_index('floor')[['total_desks', 'booked_desks_am', 'booked_desks_pm']].to_dict('index')
+        for floor, counts in day_floors.items():
+            counts['desks'] = desks_by_floor.get((current_date, floor), ())  # empty for days stored without desk lists
+        daily_desk_data_by_floor[current_date] = day_floors
 
-# Add this function to save bookings to a CSV file
-def save_bookings_to_csv(all_bookings, filename="all_bookings.csv"):
-    bookings_list = []
-    for name, bookings in all_bookings.items():
-        for booking in bookings:
-            booking["name"] = name
-            bookings_list.append(booking)
-    
-    df = pd.DataFrame(bookings_list)
-    df.to_csv(filename, index=False)
-
-
-
-# Add this function to load bookings from a CSV file
-def load_bookings_from_csv(filename="all_bookings.csv"):
-    if os.path.exists(filename):
-        df = pd.read_csv(filename)
-        all_bookings = {}
-        for _, row in df.iterrows():
-            name = row['name']
-            if name not in all_bookings:
-                all_bookings[name] = []
-            all_bookings[name].append({
-                'date': row['date'],
-                'desk': row['desk'],
-                'startTime': row['startTime'],
-                'endTime': row['endTime']
-            })
-        return all_bookings
-    else:
-        return {}
\ No newline at end of file
+    return all_bookings, booked_names(all_bookings), {}, daily_desk_data_by_floor
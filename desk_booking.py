@@ -1,80 +1,427 @@
 import datetime
+import hashlib
+import json
+import time
+from collections import deque, namedtuple
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from functools import partial
 
+import numpy as np
 import pandas as pd
 import requests
-import streamlit as st
+from requests.adapters import HTTPAdapter
 
+try:
+    import ijson
+except ImportError:  # optional: streaming JSON decoding
+    ijson = None
 
-# Function to get all desk bookings for a given date range
-@st.cache_data(show_spinner="Fetching desk booking data...")
-def get_all_desk_bookings(url, headers, start_date, end_date):
-    all_bookings = {}
-    all_team_members = set()
-    daily_desk_data = {}  
-    daily_desk_data_by_floor = {}  
+from booking_cache import IN_FLIGHT_TIMEOUT, building_scope
+from booking_table import (RAW_COLUMNS, booked_names, bookings_frame,
+                           concat_bookings, empty_bookings, format_dates)
+from fetch_scheduler import (DEFAULT_TIMEOUT, AdaptiveLimiter, WindowTuner,
+                             call_with_retries, describe_error, is_auth_error)
+from metrics import METRICS
 
-    delta = (end_date - start_date).days
-    for i in range(delta + 1):
 
-        current_date = (start_date + datetime.timedelta(days=i)).strftime('%Y-%m-%d')
-        payload = {
-            "buildingId": "",
-            "startDate": f"{current_date}T00:00:00",
-            "endDate": f"{current_date}T23:59:59"
+# Unity Place endpoint returning the desks and time slots for a building
+GET_DESKS_URL = "https://unityplace.smarttwin.app/UnityPlace/mobile-api/v1/bookingavailability/GetDesks"
+
+# Maximum number of day requests in flight at once
+DEFAULT_MAX_WORKERS = 8
+
+
+# Function to build the request headers for a user's API token
+def build_headers(token):
+    return {
+        "Authorization": f"Bearer {token}",
+        "Content-Type": "application/x-www-form-urlencoded",
+        "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/116.0.0.0 Safari/537.36",
+    }
+
+
+# Function to create a pooled keep-alive session shared by all day requests
+def create_session(max_workers=DEFAULT_MAX_WORKERS):
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max_workers)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+# Raised when a multi-day response has time slots without dates, so it cannot be split per day
+class WindowNotSplittable(ValueError):
+    pass
+
+
+# Streams a response body, decoding one floor at a time and counting the bytes read,
+# so the full JSON tree is never held in memory
+class ResponseBody:
+    def __init__(self, response):
+        self.response = response
+        self.bytes_read = 0
+
+    def read(self, size=-1):
+        data = self.response.raw.read(size)
+        self.bytes_read += len(data)
+        return data
+
+    def iter_floors(self):
+        if ijson is None:  # without ijson, fall back to decoding the whole body at once
+            content = self.response.content
+            self.bytes_read = len(content)
+            yield from json.loads(content).get('floors', [])
+            return
+        self.response.raw.decode_content = True
+        yield from ijson.items(self, 'floors.item', use_float=True)
+
+
+# Function to fetch and parse the booking data for a window of consecutive days in one
+# request. Returns the parsed days keyed by date and the response's size, latency and
+# validators. previous, if given, holds the last parsed version of the days: floors whose
+# content has not changed are reused from it, and a single day is requested conditionally
+# with its validators (ETag / Last-Modified) if the API sent any.
+def fetch_window(session, url, headers, dates, timeout=DEFAULT_TIMEOUT, previous=None, validators=None):
+    payload = {
+        "buildingId": "",
+        "startDate": f"{dates[0]}T00:00:00",
+        "endDate": f"{dates[-1]}T23:59:59"
+    }
+    request_headers = dict(headers)
+    if validators and previous and all(current_date in previous for current_date in dates):
+        if validators.get('etag'):
+            request_headers["If-None-Match"] = validators['etag']
+        if validators.get('last_modified'):
+            request_headers["If-Modified-Since"] = validators['last_modified']
+
+    started = time.monotonic()
+    with session.post(url, headers=request_headers, data=payload, stream=True, timeout=timeout) as response:
+        latency = time.monotonic() - started  # time until the response headers arrived
+        response.raise_for_status()
+        not_modified = response.status_code == 304  # nothing has changed since the previous fetch
+        if not_modified:
+            METRICS.increment('not_modified')
+            days, nbytes, dated_slots = {current_date: previous[current_date] for current_date in dates}, 0, None
+        else:
+            body = ResponseBody(response)
+            days, dated_slots = parse_floors(body.iter_floors(), dates, previous)
+            nbytes = body.bytes_read
+            validators = {'etag': response.headers.get("ETag"), 'last_modified': response.headers.get("Last-Modified")}
+    seconds = time.monotonic() - started
+    METRICS.record_request(dates, latency, seconds, nbytes)
+    return days, {'seconds': seconds, 'bytes': nbytes, 'validators': validators if validators and any(validators.values()) else None, 'not_modified': not_modified, 'dated_slots': dated_slots}
+
+
+# Function to split a slot time into its date (None if it has none) and 'HH:MM:SS' time of day
+def split_slot_time(value):
+    if len(value) > 8:  # e.g. '2023-10-02T09:00:00'
+        return value[:10], value[11:19]
+    return None, value
+
+
+# Function to fingerprint a floor's desks and booked slots for one day
+def floor_content_hash(desks, rows):
+    return hashlib.sha1(repr((desks, rows)).encode()).hexdigest()
+
+
+# Function to build each day's booking table and per-floor desk counts from a stream of floors.
+# Slots are assigned to days by their own date, so one response can cover several days.
+# Each floor-day is hashed; when previous holds a day with the same hash for a floor, that
+# floor's rows and counts are reused from it instead of being parsed again.
+# Also returns whether the slot times carry dates (None if there were no slots), which
+# decides whether days can be requested in multi-day windows.
+def parse_floors(floors, dates, previous=None):
+    previous = previous or {}
+    dated_slots = None
+    changed_rows = []
+    desks_by_floor = {}
+    floor_hashes = {current_date: {} for current_date in dates}
+    reused_floors = {current_date: [] for current_date in dates}
+
+    started = time.perf_counter()
+    for floor in floors:
+        floor_name = floor['floorName']
+        desks_by_floor[floor_name] = tuple(desk['name'] for desk in floor.get('desks', []))
+
+        floor_rows = {}
+        for desk in floor.get('desks', []):
+            for slot in desk.get('timeSlots', []):
+                if dated_slots is None:
+                    dated_slots = split_slot_time(slot['startTime'])[0] is not None
+                if slot['user']:  # only consider slots that are booked
+                    slot_date, start_time = split_slot_time(slot['startTime'])
+                    _, end_time = split_slot_time(slot['endTime'])
+                    if slot_date is None:
+                        if len(dates) > 1:
+                            raise WindowNotSplittable("Time slots have no dates")
+                        slot_date = dates[0]
+                    floor_rows.setdefault(slot_date, []).append((slot_date, floor_name, desk['name'], slot['user']['name'], start_time, end_time, slot['availability']))
+
+        for current_date in dates:
+            rows = floor_rows.get(current_date, [])
+            floor_hash = floor_content_hash(desks_by_floor[floor_name], rows)
+            floor_hashes[current_date][floor_name] = floor_hash
+            previous_floor = previous[current_date][1].get(floor_name) if current_date in previous else None
+            if previous_floor is not None and previous_floor.get('hash') == floor_hash:
+                reused_floors[current_date].append(floor_name)
+            else:
+                changed_rows.extend(rows)
+    METRICS.observe('decode_seconds', time.perf_counter() - started)  # includes reading a streamed body
+
+    started = time.perf_counter()
+    columns = dict(zip(RAW_COLUMNS, map(list, zip(*changed_rows)))) if changed_rows else {column: [] for column in RAW_COLUMNS}
+    bookings = bookings_frame(columns)
+    rows_by_date = bookings.groupby(format_dates(bookings['date'])).indices
+    days = {}
+    for current_date in dates:
+        reused = reused_floors[current_date]
+        day_bookings = bookings.iloc[rows_by_date.get(current_date, [])].reset_index(drop=True)
+        day_floors = count_floor_bookings(day_bookings, {floor_name: desks for floor_name, desks in desks_by_floor.items() if floor_name not in reused})
+        if reused:
+            previous_bookings, previous_floors = previous[current_date]
+            day_bookings = merge_floor_bookings(day_bookings, previous_bookings, reused, list(desks_by_floor))
+            day_floors.update({floor_name: previous_floors[floor_name] for floor_name in reused})
+        days[current_date] = day_bookings, {floor_name: {**day_floors[floor_name], 'hash': floor_hashes[current_date][floor_name]} for floor_name in desks_by_floor}
+        METRICS.increment('floors_reused', len(reused))
+        METRICS.increment('floors_parsed', len(desks_by_floor) - len(reused))
+    METRICS.observe('aggregate_seconds', time.perf_counter() - started)
+    return days, dated_slots
+
+
+# Function to combine a day's freshly parsed rows with the rows of its unchanged floors from
+# the previous fetch, keeping the floors in response order
+def merge_floor_bookings(day_bookings, previous_bookings, reused_floors, floor_order):
+    kept = previous_bookings[previous_bookings['floor'].isin(reused_floors)]
+    merged = concat_bookings([day_bookings, kept])
+    order = merged['floor'].astype(str).map({floor_name: position for position, floor_name in enumerate(floor_order)})
+    return merged.iloc[np.argsort(order.to_numpy(), kind='stable')].reset_index(drop=True)
+
+
+# Function to count the desks booked in the morning and afternoon on each floor of a single day.
+# Each floor also keeps the names of all its desks, booked or not.
+def count_floor_bookings(day_bookings, desks_by_floor):
+    booked = day_bookings.groupby(['floor', 'half'], observed=True)['desk'].nunique()
+    day_floors = {}
+    for floor_name, desks in desks_by_floor.items():
+        day_floors[floor_name] = {
+            'total_desks': len(desks),
+            'booked_desks_am': int(booked.get((floor_name, 'AM'), 0)),
+            'booked_desks_pm': int(booked.get((floor_name, 'PM'), 0)),
+            'desks': desks,
         }
-        try:  # try to make the request
-            response = requests.post(url, headers=headers, data=payload)
-            response.raise_for_status()
-        except requests.exceptions.RequestException as e:  # catch any RequestException
-            st.error("Unable to fetch booking data, please try again later.")
-            st.stop()
-        response_data = response.json()
-
-        for floor in response_data.get('floors', []):
-            total_desks = len(floor.get('desks', []))  
-            booked_desks = 0  
-            booked_desks_morning = set()  
-            booked_desks_afternoon = set()  
-
-            for desk in floor.get('desks', []):
-                for slot in desk.get('timeSlots', []):
-                    if slot['user']:  # only consider slots that are booked
-                        user_name = slot['user']['name']  # get the user's name
-                        all_team_members.add(user_name)
-                        if user_name not in all_bookings:
-                            all_bookings[user_name] = []
-                        all_bookings[user_name].append({
-                            'date': current_date,
-                            'desk': desk['name'],
-                            'startTime': slot['startTime'],
-                            'endTime': slot['endTime'],
-                            'availability': slot['availability'],
-                        })
-
-                        if '00:00:00' <= slot['startTime'] < '13:00:00':
-                            booked_desks_morning.add(desk['id'])  
-                        elif '13:00:00' <= slot['startTime'] < '24:00:00':
-                            booked_desks_afternoon.add(desk['id']) 
-
-                booked_desks_am = len(booked_desks_morning)  
-                booked_desks_pm = len(booked_desks_afternoon)
-
-            if current_date not in daily_desk_data_by_floor:
-                daily_desk_data_by_floor[current_date] = {}
-            daily_desk_data_by_floor[current_date][floor['floorName']] = {'total_desks': total_desks, 'booked_desks_am': booked_desks_am, 'booked_desks_pm': booked_desks_pm}
-
-    return all_bookings, sorted(list(all_team_members)), daily_desk_data, daily_desk_data_by_floor
+    return day_floors
+
+
+# Function to split the next window of consecutive dates off the front of the queue
+def _next_window(pending_dates, window_days):
+    window = [pending_dates.popleft()]
+    while pending_dates and len(window) < window_days:
+        next_date = datetime.date.fromisoformat(window[-1]) + datetime.timedelta(days=1)
+        if pending_dates[0] != next_date.strftime('%Y-%m-%d'):
+            break
+        window.append(pending_dates.popleft())
+    return window
+
+
+# Function to fetch a list of days concurrently over one pooled session. Consecutive days
+# are requested in windows sized by the WindowTuner, each request is retried with backoff
+# and the concurrency limit adapts to throttling. Returns the days fetched and, for days
+# that could not be fetched, a short description of the error.
+# previous and validators, if given, hold the last fetched version of days and their
+# response validators by date; see fetch_window. validators is updated with the new ones.
+def fetch_days(url, headers, dates, max_workers=DEFAULT_MAX_WORKERS, limiter=None, timeout=DEFAULT_TIMEOUT, tuner=None, previous=None, validators=None):
+    results = {}
+    errors = {}
+    if not dates:
+        return results, errors
+
+    previous = previous or {}
+    if validators is None:
+        validators = {}
+
+    if limiter is None:
+        limiter = AdaptiveLimiter(max_workers)
+    if tuner is None:
+        tuner = WindowTuner()
+    pending_dates = deque(sorted(dates))
+    single_days = set()  # days to retry on their own after their window failed
+    in_flight = {}
+
+    max_workers = max(1, min(limiter.maximum, len(dates)))
+    with create_session(max_workers) as session:
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            while pending_dates or in_flight:
+                while pending_dates and len(in_flight) < max_workers:
+                    window_days = 1 if pending_dates[0] in single_days else tuner.next_window()
+                    window = _next_window(pending_dates, window_days)
+                    window_previous = {current_date: previous[current_date] for current_date in window if current_date in previous}
+                    window_validators = validators.get(window[0]) if len(window) == 1 else None
+                    fetch = partial(fetch_window, session, url, headers, window, timeout, window_previous, window_validators)
+                    in_flight[executor.submit(call_with_retries, fetch, limiter)] = window
+
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    window = in_flight.pop(future)
+                    try:
+                        days, stats = future.result()
+                    except WindowNotSplittable:
+                        tuner.disable()
+                        single_days.update(window)
+                        pending_dates.extendleft(reversed(window))
+                    except Exception as e:  # keep the days that did succeed
+                        METRICS.increment('fetch_errors', error=describe_error(e))
+                        if is_auth_error(e):  # every other day would be rejected too
+                            errors.update({current_date: describe_error(e) for current_date in window})
+                            pending_dates.clear()
+                        elif len(window) > 1:
+                            tuner.on_failure()
+                            single_days.update(window)
+                            pending_dates.extendleft(reversed(window))
+                        else:
+                            errors[window[0]] = describe_error(e)
+                    else:
+                        if len(window) == 1:
+                            tuner.observe_slots(stats['dated_slots'])
+                        if not stats.get('not_modified'):
+                            tuner.record(len(window), stats['seconds'], stats['bytes'])
+                        if len(window) == 1 and stats['validators']:
+                            validators[window[0]] = stats['validators']
+                        results.update(days)
+
+    for current_date in dates:
+        if current_date not in results and current_date not in errors:
+            errors[current_date] = "Not fetched"
+    return results, errors
+
+
+# Function to fetch days into the shared DayCache, coalescing with fetches of the same
+# days already in flight. Expired days still held by the cache are passed on as the
+# previous version, so only their changed floors are reprocessed. A token the API has just
+# accepted is authorised before any waiting callers are woken, so callers with the same token
+# do not check it again. Returns the days this call fetched, the days it waited for and the
+# errors for days that could not be fetched.
+def fetch_into_cache(url, headers, dates, cache, scope, **fetch_kwargs):
+    owned, waiting = cache.claim(scope, dates)
+    try:
+        previous, validators = {}, {}
+        for current_date in owned:
+            day, day_validators = cache.get_stale(scope, current_date)
+            if day is not None:
+                previous[current_date] = day
+            if day_validators:
+                validators[current_date] = day_validators
+        fetched, errors = fetch_days(url, headers, owned, previous=previous, validators=validators, **fetch_kwargs)
+        if fetched:
+            cache.authorise(headers)
+        for current_date, day in fetched.items():
+            cache.put(scope, current_date, day, validators.get(current_date))
+    finally:
+        for current_date in owned:
+            cache.release(scope, current_date)
+
+    waited = {}
+    for current_date, event in waiting.items():
+        event.wait(IN_FLIGHT_TIMEOUT)
+        day = cache.get(scope, current_date)
+        if day is not None:
+            waited[current_date] = day
+        else:
+            errors[current_date] = "Not fetched"
+    return fetched, waited, errors
+
+
+# Function to make sure a token may read the shared DayCache, checking it with one upstream
+# call for check_date if it has not been accepted by the API recently. Concurrent checks of
+# the same token are coalesced with claim_authorisation/release_authorisation, and the day
+# fetched by the check is kept in the cache, without touching any other caller's claim on
+# that day. Returns None once the token is authorised,
+# or the error the API rejected it with.
+def authorise_token(url, headers, cache, check_date, **fetch_kwargs):
+    if cache.is_authorised(headers):
+        return None
+    event = cache.claim_authorisation(headers)
+    if event is not None:  # another caller is checking the same token
+        event.wait(IN_FLIGHT_TIMEOUT)
+        if cache.is_authorised(headers):
+            return None
+        return cache.authorisation_error(headers) or "Not fetched"
+
+    error = "Not fetched"
+    try:
+        fetched, errors = fetch_days(url, headers, [check_date], **fetch_kwargs)
+        scope = building_scope(url)
+        for current_date, day in fetched.items():
+            cache.put(scope, current_date, day)
+        error = None if fetched else errors.get(check_date, "Not fetched")
+    finally:
+        cache.release_authorisation(headers, error)
+    return error
+
+
+# Function to get all desk bookings for a given date range. When a DayCache is given,
+# the range is assembled from cached days and only missing or expired days are fetched.
+# Cached days are shared between users, so a token that has not recently been accepted
+# by the API is checked with one upstream call before any cached day is served.
+# on_day_fetched, if given, is called with (date, day_bookings, day_floors) for every
+# day fetched from the API, e.g. to append it to the local snapshot store.
+# Days that could not be fetched are left out and reported in fetch_errors.
+def get_all_desk_bookings(url, headers, start_date, end_date, cache=None, max_workers=DEFAULT_MAX_WORKERS, on_day_fetched=None, limiter=None, tuner=None):
+    daily_desk_data = {}
+    daily_desk_data_by_floor = {}
+
+    delta = (end_date - start_date).days
+    dates = [(start_date + datetime.timedelta(days=i)).strftime('%Y-%m-%d') for i in range(delta + 1)]
+    fetch_kwargs = {'max_workers': max_workers, 'limiter': limiter, 'tuner': tuner}
+
+    results = {}
+    if cache is None:
+        fetched, fetch_errors = fetch_days(url, headers, dates, **fetch_kwargs)
+    else:
+        scope = building_scope(url)
+        for current_date in dates:
+            cached = cache.get(scope, current_date)
+            if cached is not None:
+                results[current_date] = cached
+        missing_dates = [current_date for current_date in dates if current_date not in results]
+        METRICS.increment('cache_hits', len(results))
+        METRICS.increment('cache_misses', len(missing_dates))
+        needs_authorisation = not cache.is_authorised(headers)
+
+        fetched, waited, fetch_errors = fetch_into_cache(url, headers, missing_dates, cache, scope, **fetch_kwargs)
+        results.update(waited)
+        if needs_authorisation and not fetched:  # nothing was fetched with this token, so check it with one upstream call
+            error = authorise_token(url, headers, cache, dates[0], **fetch_kwargs)
+            if error is not None:
+                return empty_bookings(), [], daily_desk_data, daily_desk_data_by_floor, {current_date: error for current_date in dates}
+
+    for current_date, day in sorted(fetched.items()):
+        results[current_date] = day
+        if on_day_fetched is not None:
+            on_day_fetched(current_date, *day)
+
+    # Merge the per-day results in date order
+    started = time.perf_counter()
+    fetched_dates = [current_date for current_date in dates if current_date in results]
+    for current_date in fetched_dates:
+        day_bookings, day_floors = results[current_date]
+        if day_floors:
+            daily_desk_data_by_floor[current_date] = day_floors
+    all_bookings = concat_bookings([results[current_date][0] for current_date in fetched_dates])
+    METRICS.observe('merge_seconds', time.perf_counter() - started)
+
+    return all_bookings, booked_names(all_bookings), daily_desk_data, daily_desk_data_by_floor, fetch_errors
 
 
 # Function to collect team member names based on actual bookings
 def collect_team_members(all_bookings):
     team_members = []
+    booked = set(booked_names(all_bookings))
     
     while True:
         name = input("Enter a team member's name (or type 'done' to finish): ")
         if name.lower() == 'done':
             break
-        elif name in all_bookings:
+        elif name in booked:
             team_members.append(name)
         else:
             print("Invalid name. Please try again.")
@@ -83,111 +430,119 @@ def collect_team_members(all_bookings):
 
 
 
-# Function to check desk bookings for selected team members
-def check_desk_bookings(team_members, all_bookings, st, start_date, end_date):
-    for name in team_members:
-        st.subheader(f"Bookings for {name}:")
-        daily_bookings = {}
-        for booking in all_bookings.get(name, []):
-            booking_date = datetime.datetime.strptime(booking['date'], '%Y-%m-%d').date()
-            if start_date <= booking_date <= end_date:
-                start_time = datetime.datetime.strptime(booking['startTime'], '%H:%M:%S').time()
-                end_time = datetime.datetime.strptime(booking['endTime'], '%H:%M:%S').time()
-
-                booking_period = ""
-                if start_time <= datetime.datetime.strptime('00:00:00', '%H:%M:%S').time() and end_time >= datetime.datetime.strptime('23:59:00', '%H:%M:%S').time():
-                    booking_period = "All Day"
-                elif end_time <= datetime.datetime.strptime('13:00:00', '%H:%M:%S').time():
-                    booking_period = "Morning Only"
-                elif start_time >= datetime.datetime.strptime('13:00:00', '%H:%M:%S').time():
-                    booking_period = "Afternoon Only"
-                
-                if booking_date not in daily_bookings or booking_period == "All Day":
-                    daily_bookings[booking_date] = {
-                        'date': booking['date'],
-                        'desk': booking['desk'],
-                        'bookingPeriod': booking_period,
-                        'name': name
-                    }
-
-        bookings_list = list(daily_bookings.values())
-        if bookings_list:
-            df = pd.DataFrame(bookings_list)
-            st.table(df[['date', 'desk', 'bookingPeriod']])
-        else:
-            st.write("No bookings found for this date range.")
+# Function to read a team CSV file: a single column of names, no header, each followed by a comma
+def read_team_file(file):
+    team_df = pd.read_csv(file, skipinitialspace=True, header=None)
+    return [str(name).strip(',').strip() for name in team_df.iloc[:, 0].tolist()]  # remove trailing commas
+
+
+# Function to get one booking per person per day for the selected team members.
+# A person's first booking of the day is used unless they also have an all-day booking.
+def get_person_bookings(team_members, all_bookings, start_date, end_date):
+    in_range = all_bookings['date'].between(pd.Timestamp(start_date), pd.Timestamp(end_date))
+    df = all_bookings.loc[in_range & all_bookings['name'].isin(team_members), ['date', 'name', 'desk', 'period']]
+    df = df.rename(columns={'period': 'bookingPeriod'})
+
+    first = df.drop_duplicates(['name', 'date'], keep='first')
+    all_day = df[df['bookingPeriod'] == "All Day"].drop_duplicates(['name', 'date'], keep='last')
+    df = pd.concat([all_day, first]).drop_duplicates(['name', 'date'], keep='first')
 
+    df['name'] = df['name'].astype(str)
+    df['desk'] = df['desk'].astype(str)
+    df['bookingPeriod'] = df['bookingPeriod'].astype(str)
+    member_order = {name: position for position, name in enumerate(team_members)}
+    df = df.assign(member_order=df['name'].map(member_order)).sort_values(['date', 'member_order'], kind='stable')
+    df['date'] = format_dates(df['date'])
+    return df[['date', 'name', 'desk', 'bookingPeriod']].reset_index(drop=True)
+
+
+# Short labels for the booking periods shown in the attendance grid
+PERIOD_LABELS = {"All Day": "All day", "Morning Only": "AM", "Afternoon Only": "PM"}
+
+
+# Function to build a people x dates attendance grid from one pass over the bookings. Each cell
+# holds the person's desk and booking period that day (empty when they have no booking).
+def attendance_matrix(team_members, all_bookings, start_date, end_date):
+    person_bookings = get_person_bookings(team_members, all_bookings, start_date, end_date)
+    periods = person_bookings['bookingPeriod'].map(PERIOD_LABELS).fillna("")
+    cells = person_bookings['desk'].where(periods == "", person_bookings['desk'] + " (" + periods + ")")
+    dates = [current_date.strftime('%Y-%m-%d') for current_date in pd.date_range(start_date, end_date)]
+    matrix = pd.Series(cells.to_numpy(), index=pd.MultiIndex.from_frame(person_bookings[['name', 'date']])).unstack('date')
+    matrix = matrix.reindex(index=pd.Index(list(dict.fromkeys(team_members)), name='name'), columns=dates).fillna("")
+    matrix.columns.name = None
+    return matrix
+
+
+# Function to check desk bookings for selected team members, as one grid with a CSV download
+def check_desk_bookings(team_members, all_bookings, st, start_date, end_date):
+    matrix = attendance_matrix(team_members, all_bookings, start_date, end_date)
+    st.dataframe(matrix)
+    st.download_button("Download attendance (CSV)", matrix.to_csv(), file_name=f"attendance_{start_date}_{end_date}.csv", mime="text/csv")
 
 
 def check_team_desk_bookings(team_members, all_bookings, st, start_date, end_date):
-    bookings_by_date = {}
-
-    for name in team_members:
-        daily_bookings = {}
-        for booking in all_bookings.get(name, []):
-            booking_date = datetime.datetime.strptime(booking['date'], '%Y-%m-%d').date()
-            if start_date <= booking_date <= end_date:
-                start_time = datetime.datetime.strptime(booking['startTime'], '%H:%M:%S').time()
-                end_time = datetime.datetime.strptime(booking['endTime'], '%H:%M:%S').time()
-
-                booking_period = ""
-                if start_time <= datetime.datetime.strptime('00:00:00', '%H:%M:%S').time() and end_time >= datetime.datetime.strptime('23:59:00', '%H:%M:%S').time():
-                    booking_period = "All Day"
-                elif end_time <= datetime.datetime.strptime('13:00:00', '%H:%M:%S').time():
-                    booking_period = "Morning Only"
-                elif start_time >= datetime.datetime.strptime('13:00:00', '%H:%M:%S').time():
-                    booking_period = "Afternoon Only"
-                
-                if booking_date not in daily_bookings or booking_period == "All Day":
-                    daily_bookings[booking_date] = {
-                        'date': booking['date'],
-                        'desk': booking['desk'],
-                        'bookingPeriod': booking_period,
-                        'name': name
-                    }
-        
-        for date, booking in daily_bookings.items():
-            if date not in bookings_by_date:
-                bookings_by_date[date] = []
-            bookings_by_date[date].append(booking)
-
-    for date, bookings in bookings_by_date.items():
-        st.subheader(f"Bookings for {date.strftime('%Y-%m-%d')}:")
-
-        bookings_list = bookings
-        if bookings_list:
-            df = pd.DataFrame(bookings_list)
-            st.table(df[['date', 'name', 'desk', 'bookingPeriod']])
-        else:
-            st.write("No bookings found for this date.")
+    person_bookings = get_person_bookings(team_members, all_bookings, start_date, end_date)
+
+    for date, df in person_bookings.groupby('date', sort=True):
+        st.subheader(f"Bookings for {date}:")
+        st.table(df[['date', 'name', 'desk', 'bookingPeriod']].reset_index(drop=True))
     
 
 
-def get_desk_availability(desk_names, all_bookings, start_date, end_date):
-    desk_availability = []
-    for name, bookings in all_bookings.items():
-        for booking in bookings:
-            if booking['desk'] in desk_names:
-                booking['name'] = name
-                desk_availability.append(booking)
-    df = pd.DataFrame(desk_availability)
-    df = df[['date', 'desk', 'name', 'availability']]
+# Date x floor x field occupancy array, built once per fetch for the Office Capacity tab
+Occupancy = namedtuple('Occupancy', ['dates', 'floors', 'values'])
+OCCUPANCY_FIELDS = ['total_desks', 'booked_desks_am', 'booked_desks_pm', 'booked_desks', 'available_desks']
+
+
+# Function to build the occupancy array from the per-floor desk counts
+def build_occupancy_matrix(daily_desk_data_by_floor):
+    dates = sorted(daily_desk_data_by_floor)
+    floors = sorted({floor_name for floors in daily_desk_data_by_floor.values() for floor_name in floors})
+    floor_positions = {floor_name: position for position, floor_name in enumerate(floors)}
+
+    values = np.zeros((len(dates), len(floors), len(OCCUPANCY_FIELDS)), dtype=np.int32)
+    for date_position, current_date in enumerate(dates):
+        for floor_name, counts in daily_desk_data_by_floor[current_date].items():
+            values[date_position, floor_positions[floor_name], :3] = (counts['total_desks'], counts['booked_desks_am'], counts['booked_desks_pm'])
+    values[..., 3] = values[..., 1:3].max(axis=-1)
+    values[..., 4] = values[..., 0] - values[..., 3]
+    return Occupancy(dates, floors, values)
+
+
+# Function to flatten the occupancy array into one row per date and floor
+def occupancy_frame(occupancy):
+    df = pd.DataFrame(occupancy.values.reshape(-1, len(OCCUPANCY_FIELDS)), columns=OCCUPANCY_FIELDS)
+    df.insert(0, 'floor', np.tile(occupancy.floors, len(occupancy.dates)))
+    df.insert(0, 'date', np.repeat(occupancy.dates, len(occupancy.floors)))
+    return df
+
+
+# Function to build a desk -> booking row positions index, once per fetch
+def build_desk_index(all_bookings):
+    return all_bookings.groupby('desk', observed=True).indices
+
+
+def get_desk_availability(desk_names, all_bookings, start_date, end_date, desk_index=None):
+    if desk_index is None:
+        desk_index = build_desk_index(all_bookings)
+
+    # Only touch the booking rows of the selected desks
+    positions = [desk_index[desk] for desk in desk_names if desk in desk_index]
+    rows = np.concatenate(positions) if positions else np.array([], dtype=int)
+    df = all_bookings.iloc[rows]
+    df = df.loc[df['date'].between(pd.Timestamp(start_date), pd.Timestamp(end_date)), ['date', 'desk', 'name', 'availability']]
+    df = df.astype({'desk': str, 'name': str, 'availability': str})
     
     # Assuming that if a desk is booked by the same person on the same day in the morning and afternoon, it's a single booking
-    df['date'] = pd.to_datetime(df['date'])
-    df = df.groupby(['date', 'desk', 'name']).agg({'availability': 'first'}).reset_index()
-    
-    # Create a DataFrame with all possible combinations of dates and desks
-    date_range = pd.date_range(start_date, end_date)
-    all_combinations = pd.MultiIndex.from_product([date_range, desk_names], names=['date', 'desk'])
-    all_df = pd.DataFrame(index=all_combinations).reset_index()
+    booked_df = df.drop_duplicates(['date', 'desk', 'name'])
     
-    # Merge the DataFrame with all combinations with the actual bookings, filling in gaps with "Available"
-    merged_df = pd.merge(all_df, df, on=['date', 'desk'], how='left')
-    merged_df['availability'].fillna('Available', inplace=True)
-    merged_df['name'].fillna('', inplace=True)
+    # Every date/desk pair without a booking is "Available"
+    all_pairs = pd.MultiIndex.from_product([pd.date_range(start_date, end_date), desk_names], names=['date', 'desk'])
+    free_pairs = all_pairs[~all_pairs.isin(pd.MultiIndex.from_frame(booked_df[['date', 'desk']]))]
+    free_df = free_pairs.to_frame(index=False).assign(name='', availability='Available')
     
     # Sort by date and then desk
-    merged_df = merged_df.sort_values(['date', 'desk'])
+    availability_df = pd.concat([booked_df, free_df], ignore_index=True)
+    availability_df = availability_df.sort_values(['date', 'desk', 'name'], kind='stable').reset_index(drop=True)
 
-    return merged_df
\ No newline at end of file
+    return availability_df
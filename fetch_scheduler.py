@@ -0,0 +1,169 @@
+import email.utils
+import random
+import threading
+import time
+
+import requests
+
+# Per-request timeout in seconds: (connect, read)
+DEFAULT_TIMEOUT = (5, 30)
+
+# Retry settings for throttled, timed out or failing requests
+MAX_RETRIES = 3
+BACKOFF_BASE = 0.5
+BACKOFF_CAP = 30.0
+THROTTLE_STATUSES = {429, 503}
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+AUTH_STATUSES = {401, 403}
+
+
+# Concurrency limit that halves when the API throttles us and grows back by one
+# after a full window of successful requests (additive increase, multiplicative decrease)
+class AdaptiveLimiter:
+    def __init__(self, limit, maximum=None, minimum=1):
+        self.minimum = minimum
+        self.maximum = maximum or limit
+        self.limit = max(minimum, min(limit, self.maximum))
+        self._active = 0
+        self._successes = 0
+        self._condition = threading.Condition()
+
+    def __enter__(self):
+        with self._condition:
+            while self._active >= self.limit:
+                self._condition.wait()
+            self._active += 1
+        return self
+
+    def __exit__(self, *exc_info):
+        with self._condition:
+            self._active -= 1
+            self._condition.notify_all()
+
+    def on_success(self):
+        with self._condition:
+            self._successes += 1
+            if self._successes >= self.limit and self.limit < self.maximum:
+                self.limit += 1
+                self._successes = 0
+                self._condition.notify_all()
+
+    def on_throttle(self):
+        with self._condition:
+            self.limit = max(self.minimum, self.limit // 2)
+            self._successes = 0
+
+
+# Function to read a Retry-After header (seconds or HTTP date) as a number of seconds
+def retry_after_seconds(response):
+    if response is None:
+        return None
+    value = response.headers.get("Retry-After")
+    if not value:
+        return None
+    if value.strip().isdigit():
+        return float(value)
+    try:
+        retry_at = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, retry_at.timestamp() - time.time())
+
+
+# Function to work out how long to wait before the next attempt, using full jitter
+def backoff_delay(attempt, retry_after=None):
+    delay = random.uniform(0, min(BACKOFF_CAP, BACKOFF_BASE * 2 ** attempt))
+    if retry_after is not None:
+        delay = max(delay, min(retry_after, BACKOFF_CAP))
+    return delay
+
+
+def _status(error):
+    response = getattr(error, 'response', None)
+    return response.status_code if response is not None else None
+
+
+# Function to check whether a failed request was rejected for its token
+def is_auth_error(error):
+    return _status(error) in AUTH_STATUSES
+
+
+# Function to describe a failed request for the per-day status shown to the user
+def describe_error(error):
+    status = _status(error)
+    if status is not None:
+        return f"HTTP {status}"
+    if isinstance(error, requests.exceptions.Timeout):
+        return "Timed out"
+    if isinstance(error, requests.exceptions.ConnectionError):
+        return "Connection error"
+    if isinstance(error, requests.exceptions.RequestException):
+        return "Request failed"
+    return "Invalid response"
+
+
+# Function to call fn within the limiter, retrying throttled, failed and timed out requests
+def call_with_retries(fn, limiter, max_retries=MAX_RETRIES, sleep=time.sleep):
+    for attempt in range(max_retries + 1):
+        with limiter:
+            try:
+                result = fn()
+            except requests.exceptions.RequestException as e:
+                status = _status(e)
+                if status in THROTTLE_STATUSES:
+                    limiter.on_throttle()
+                if (status is not None and status not in RETRY_STATUSES) or attempt == max_retries:
+                    raise
+                delay = backoff_delay(attempt, retry_after_seconds(getattr(e, 'response', None)))
+            else:
+                limiter.on_success()
+                return result
+        sleep(delay)  # wait outside the limiter so other requests can use the slot
+
+
+# Window sizing for multi-day requests: aim for responses that come back within
+# TARGET_WINDOW_SECONDS and stay under MAX_WINDOW_BYTES
+DEFAULT_WINDOW_DAYS = 7
+MAX_WINDOW_DAYS = 31
+TARGET_WINDOW_SECONDS = 5.0
+MAX_WINDOW_BYTES = 16 * 1024 * 1024
+
+
+# Tunes how many days to request per call from the size and latency of past responses.
+# Multi-day responses can only be split into days if their slot times carry dates, so days
+# are requested one per call until a single-day response shows dated slots (supported=None),
+# unless windows are switched on or off explicitly with supported=True or False.
+class WindowTuner:
+    def __init__(self, window=DEFAULT_WINDOW_DAYS, maximum=MAX_WINDOW_DAYS, target_seconds=TARGET_WINDOW_SECONDS, max_bytes=MAX_WINDOW_BYTES, supported=None):
+        self.window = window
+        self.maximum = maximum
+        self.target_seconds = target_seconds
+        self.max_bytes = max_bytes
+        self.supported = supported
+        self._lock = threading.Lock()
+
+    def next_window(self):
+        with self._lock:
+            return self.window if self.supported else 1
+
+    def record(self, days, seconds, nbytes):
+        seconds_per_day = max(seconds / days, 1e-3)
+        bytes_per_day = max(nbytes / days, 1)
+        fits = int(min(self.target_seconds / seconds_per_day, self.max_bytes / bytes_per_day))
+        with self._lock:
+            # Grow at most twofold per response so one fast reply can't overshoot
+            self.window = max(1, min(fits, self.window * 2, self.maximum))
+
+    def on_failure(self):
+        with self._lock:
+            self.window = max(1, self.window // 2)
+
+    # Learns from a single-day response whether slot times carry dates (None if it had no slots)
+    def observe_slots(self, dated_slots):
+        with self._lock:
+            if self.supported is None and dated_slots is not None:
+                self.supported = dated_slots
+
+    def disable(self):
+        with self._lock:
+            self.supported = False
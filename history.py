@@ -0,0 +1,129 @@
+import datetime
+import os
+import sqlite3
+
+import pandas as pd
+
+# Local time series of per-day, per-floor occupancy, with weekly, monthly and day-of-week
+# rollups kept up to date as days are recorded. Only desk counts are stored, no names.
+HISTORY_DB = "occupancy_history.db"
+
+ROLLUP_PERIODS = ['week', 'month', 'weekday']
+WEEKDAYS = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS occupancy_daily (
+    date TEXT NOT NULL,
+    floor TEXT NOT NULL,
+    week TEXT NOT NULL,
+    month TEXT NOT NULL,
+    weekday TEXT NOT NULL,
+    total_desks INTEGER NOT NULL,
+    booked_desks_am INTEGER NOT NULL,
+    booked_desks_pm INTEGER NOT NULL,
+    booked_desks INTEGER NOT NULL,
+    PRIMARY KEY (date, floor)
+) WITHOUT ROWID;
+
+CREATE INDEX IF NOT EXISTS occupancy_daily_by_week ON occupancy_daily (week);
+CREATE INDEX IF NOT EXISTS occupancy_daily_by_month ON occupancy_daily (month);
+CREATE INDEX IF NOT EXISTS occupancy_daily_by_weekday ON occupancy_daily (weekday);
+
+CREATE TABLE IF NOT EXISTS occupancy_rollups (
+    period TEXT NOT NULL,
+    bucket TEXT NOT NULL,
+    floor TEXT NOT NULL,
+    days INTEGER NOT NULL,
+    total_desks INTEGER NOT NULL,
+    booked_desks INTEGER NOT NULL,
+    booked_desks_am INTEGER NOT NULL,
+    booked_desks_pm INTEGER NOT NULL,
+    peak_booked_desks INTEGER NOT NULL,
+    PRIMARY KEY (period, bucket, floor)
+) WITHOUT ROWID;
+"""
+
+
+# Function to open the history store, creating the tables if needed
+def connect(filename=HISTORY_DB):
+    conn = sqlite3.connect(filename)
+    conn.executescript(SCHEMA)
+    return conn
+
+
+# Function to work out the rollup buckets a 'YYYY-MM-DD' date falls in
+def date_buckets(current_date):
+    day = datetime.date.fromisoformat(current_date)
+    year, week, weekday = day.isocalendar()
+    return {'week': f"{year}-W{week:02d}", 'month': day.strftime('%Y-%m'), 'weekday': str(weekday)}
+
+
+# Function to record (or replace) fetched days and refresh the rollup buckets they fall in.
+# Only days before today are recorded: today and later days are still being booked, so
+# their counts are incomplete.
+def record_days(daily_desk_data_by_floor, filename=HISTORY_DB, today=None):
+    first_open_date = (today or datetime.date.today()).strftime('%Y-%m-%d')
+    rows = []
+    touched = set()
+    for current_date, floors in daily_desk_data_by_floor.items():
+        if current_date >= first_open_date:
+            continue
+        buckets = date_buckets(current_date)
+        touched.update(buckets.items())
+        for floor_name, counts in floors.items():
+            booked = max(counts['booked_desks_am'], counts['booked_desks_pm'])
+            rows.append((current_date, floor_name, buckets['week'], buckets['month'], buckets['weekday'],
+                         counts['total_desks'], counts['booked_desks_am'], counts['booked_desks_pm'], booked))
+    if not rows:
+        return
+
+    with connect(filename) as conn:
+        conn.executemany("INSERT OR REPLACE INTO occupancy_daily VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", rows)
+        for period, bucket in sorted(touched):
+            conn.execute("DELETE FROM occupancy_rollups WHERE period = ? AND bucket = ?", (period, bucket))
+            conn.execute(f"""
+                INSERT INTO occupancy_rollups
+                SELECT ?, ?, floor, COUNT(*), SUM(total_desks), SUM(booked_desks), SUM(booked_desks_am), SUM(booked_desks_pm), MAX(booked_desks)
+                FROM occupancy_daily WHERE {period} = ? GROUP BY floor
+            """, (period, bucket, bucket))
+    conn.close()
+
+
+# Function to load one rollup, optionally limited to the buckets covering a date range
+# (day-of-week buckets always cover the whole history). Returns one row per bucket and floor
+# with the average booked share and the busiest day's booked desks.
+def load_rollups(period, start_date=None, end_date=None, filename=HISTORY_DB):
+    columns = ['bucket', 'floor', 'days', 'average_booked_desks', 'average_total_desks', 'booked_share', 'peak_booked_desks']
+    if period not in ROLLUP_PERIODS:
+        raise ValueError(f"Unknown rollup period: {period}")
+    if not os.path.exists(filename):
+        return pd.DataFrame(columns=columns)
+
+    clauses, params = ["period = ?"], [period]
+    if period != 'weekday':
+        if start_date is not None:
+            clauses.append("bucket >= ?")
+            params.append(date_buckets(str(start_date))[period])
+        if end_date is not None:
+            clauses.append("bucket <= ?")
+            params.append(date_buckets(str(end_date))[period])
+    with connect(filename) as conn:
+        df = pd.read_sql_query(f"SELECT * FROM occupancy_rollups WHERE {' AND '.join(clauses)} ORDER BY bucket, floor", conn, params=params)
+    conn.close()
+
+    df['average_booked_desks'] = df['booked_desks'] / df['days']
+    df['average_total_desks'] = df['total_desks'] / df['days']
+    df['booked_share'] = df['booked_desks'] / df['total_desks'].where(df['total_desks'] > 0)
+    if period == 'weekday':
+        df['bucket'] = df['bucket'].map(lambda weekday: WEEKDAYS[int(weekday) - 1])
+    return df[columns]
+
+
+# Function to report the first and last recorded dates and the number of days recorded
+def history_range(filename=HISTORY_DB):
+    if not os.path.exists(filename):
+        return None, None, 0
+    with connect(filename) as conn:
+        first, last, days = conn.execute("SELECT MIN(date), MAX(date), COUNT(DISTINCT date) FROM occupancy_daily").fetchone()
+    conn.close()
+    return first, last, days
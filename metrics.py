@@ -0,0 +1,112 @@
+import json
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+# Prefix for exported metric names, e.g. up_desk_cache_hits_total
+METRICS_PREFIX = "up_desk_"
+
+# Number of recent upstream requests kept for the diagnostics panel
+RECENT_REQUESTS = 200
+
+
+# Process-wide counters and timings, shared by the fetch threads, the app and the CLI.
+# Timings are kept as running summaries (count, sum, min, max, last) per name and labels.
+class Metrics:
+    def __init__(self, recent_requests=RECENT_REQUESTS):
+        self.counters = {}
+        self.timings = {}
+        self.requests = deque(maxlen=recent_requests)
+        self._lock = threading.Lock()
+
+    def increment(self, name, value=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, name, seconds, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            summary = self.timings.setdefault(key, {'count': 0, 'sum': 0.0, 'min': seconds, 'max': seconds, 'last': seconds})
+            summary['count'] += 1
+            summary['sum'] += seconds
+            summary['min'] = min(summary['min'], seconds)
+            summary['max'] = max(summary['max'], seconds)
+            summary['last'] = seconds
+
+    @contextmanager
+    def timer(self, name, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - started, **labels)
+
+    # Records one upstream request: its dates, time to first byte, total time and size
+    def record_request(self, dates, latency, seconds, nbytes):
+        self.observe('http_latency_seconds', latency)
+        self.observe('http_request_seconds', seconds)
+        self.increment('response_bytes', nbytes)
+        self.increment('http_requests')
+        with self._lock:
+            self.requests.append({'dates': f"{dates[0]} to {dates[-1]}" if len(dates) > 1 else dates[0], 'latency': latency, 'seconds': seconds, 'bytes': nbytes})
+
+    def reset(self):
+        with self._lock:
+            self.counters.clear()
+            self.timings.clear()
+            self.requests.clear()
+
+    # Returns a JSON-serialisable copy of everything recorded so far
+    def snapshot(self):
+        with self._lock:
+            return {
+                'timestamp': time.time(),
+                'counters': [{'name': name, 'labels': dict(labels), 'value': value} for (name, labels), value in sorted(self.counters.items())],
+                'timings': [{'name': name, 'labels': dict(labels), **summary} for (name, labels), summary in sorted(self.timings.items())],
+                'requests': list(self.requests),
+            }
+
+    # Renders the counters and timings in the Prometheus text exposition format
+    def to_prometheus(self):
+        snapshot = self.snapshot()
+        lines = []
+        typed = set()
+        for counter in snapshot['counters']:
+            name = f"{METRICS_PREFIX}{counter['name']}_total"
+            if name not in typed:
+                lines.append(f"# TYPE {name} counter")
+                typed.add(name)
+            lines.append(f"{name}{_prometheus_labels(counter['labels'])} {counter['value']}")
+        for timing in snapshot['timings']:
+            name = f"{METRICS_PREFIX}{timing['name']}"
+            if name not in typed:
+                lines.append(f"# TYPE {name} summary")
+                typed.add(name)
+            labels = _prometheus_labels(timing['labels'])
+            lines.append(f"{name}_count{labels} {timing['count']}")
+            lines.append(f"{name}_sum{labels} {timing['sum']:.6f}")
+        return "\n".join(lines) + "\n"
+
+    # Appends the current snapshot to a JSON lines log
+    def write_json_log(self, filename):
+        with open(filename, "a") as f:
+            f.write(json.dumps(self.snapshot()) + "\n")
+
+    # Writes the Prometheus text file, replacing the previous one (e.g. for node_exporter's textfile collector)
+    def write_prometheus(self, filename):
+        with open(filename, "w") as f:
+            f.write(self.to_prometheus())
+
+
+# Function to format metric labels as {name="value",...}
+def _prometheus_labels(labels):
+    if not labels:
+        return ""
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"') for value in labels.values())
+    return "{" + ",".join(f'{name}="{value}"' for name, value in zip(labels, escaped)) + "}"
+
+
+# The metrics recorded by this process
+METRICS = Metrics()
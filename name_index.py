@@ -0,0 +1,91 @@
+import re
+import unicodedata
+
+import numpy as np
+import pandas as pd
+
+# Minimum similarity (0-1) for a close spelling to count as a match, and how far ahead of
+# the runner-up the best candidate must be for the match not to be ambiguous
+FUZZY_THRESHOLD = 0.6
+AMBIGUITY_MARGIN = 0.05
+
+# Number of candidates listed for an ambiguous name
+MAX_CANDIDATES = 5
+
+
+# Function to normalize a name for matching: accents, case, punctuation and spacing are ignored
+def normalize_name(name):
+    name = unicodedata.normalize('NFKD', str(name))
+    name = ''.join(character for character in name if not unicodedata.combining(character))
+    return ' '.join(re.sub(r'[^\w]+', ' ', name.casefold()).split())
+
+
+# Function to split a normalized name into its set of padded character trigrams
+def name_trigrams(key):
+    padded = f"  {key} "
+    return {padded[position:position + 3] for position in range(len(padded) - 2)}
+
+
+# Normalized name -> canonical name lookup, with a trigram index for close spellings.
+# Built once per fetch from the names of the people with bookings.
+class NameIndex:
+    def __init__(self, names):
+        self.names = list(names)
+        self.by_key = {}
+        self.by_sorted_key = {}  # same tokens in any order, e.g. "Musk Elon"
+        self.postings = {}  # trigram -> array of name positions
+        gram_counts = []
+        for position, name in enumerate(self.names):
+            key = normalize_name(name)
+            self.by_key.setdefault(key, []).append(name)
+            self.by_sorted_key.setdefault(' '.join(sorted(key.split())), []).append(name)
+            grams = name_trigrams(key)
+            for gram in grams:
+                self.postings.setdefault(gram, []).append(position)
+            gram_counts.append(len(grams))
+        self.postings = {gram: np.array(positions, dtype=np.int32) for gram, positions in self.postings.items()}
+        self.gram_counts = np.array(gram_counts, dtype=np.int32)
+
+    # Scores every indexed name against the key by shared trigrams (Dice coefficient)
+    def _scores(self, key):
+        grams = name_trigrams(key)
+        postings = [self.postings[gram] for gram in grams if gram in self.postings]
+        if not postings:
+            return np.zeros(len(self.names))
+        shared = np.bincount(np.concatenate(postings), minlength=len(self.names))
+        return 2 * shared / (len(grams) + self.gram_counts)
+
+    # Matches one name, returning (status, canonical name or None, score, other candidates)
+    def match(self, name, fuzzy=True, threshold=FUZZY_THRESHOLD):
+        key = normalize_name(name)
+        exact = self.by_key.get(key) or self.by_sorted_key.get(' '.join(sorted(key.split())), [])
+        if len(exact) == 1:
+            return 'exact', exact[0], 1.0, []
+        if len(exact) > 1:
+            return 'ambiguous', None, 1.0, exact
+        if not fuzzy or not key:
+            return 'unmatched', None, 0.0, []
+
+        scores = self._scores(key)
+        best = int(np.argmax(scores)) if len(scores) else 0
+        if not len(scores) or scores[best] < threshold:
+            return 'unmatched', None, 0.0, []
+        best_score = float(scores[best])
+        close = np.flatnonzero((scores > best_score - AMBIGUITY_MARGIN) & (scores >= threshold))
+        if len(close) > 1:
+            close = close[np.argsort(-scores[close], kind='stable')][:MAX_CANDIDATES]
+            return 'ambiguous', None, round(best_score, 2), [self.names[position] for position in close]
+        return 'fuzzy', self.names[best], round(best_score, 2), []
+
+    # Matches a roster of names, one row per name with its status and the matched canonical name
+    def resolve(self, names, fuzzy=True, threshold=FUZZY_THRESHOLD):
+        rows = []
+        for name in names:
+            status, match, score, candidates = self.match(name, fuzzy, threshold)
+            rows.append({'name': name, 'match': match, 'score': score, 'status': status, 'candidates': ", ".join(candidates)})
+        return pd.DataFrame(rows, columns=['name', 'match', 'score', 'status', 'candidates'])
+
+
+# Function to list the matched canonical names from a resolved roster, once each, in roster order
+def matched_names(resolved):
+    return resolved['match'].dropna().drop_duplicates().tolist()
@@ -0,0 +1,100 @@
+import json
+import os
+import re
+import threading
+
+import pandas as pd
+
+# Named neighbourhoods per floor. Floors not listed here are grouped by the
+# neighbourhood letter in their desk names once their desks have been fetched.
+# The file is kept next to app.py, whatever directory the app or CLI is started from.
+NEIGHBOURHOODS_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "neighbourhoods.json")
+
+OTHER_NEIGHBOURHOOD = "Other"
+
+# Desk names look like "Desk 6.A07.3": floor 6, neighbourhood A, bank 07, seat 3
+DESK_NAME_PATTERN = re.compile(r'^Desk (\d+)\.([A-Za-z]+)(\d+)\.(\d+)$')
+
+
+# Function to split a desk name into (floor number, neighbourhood letter, bank, seat), or None
+def parse_desk_name(desk_name):
+    match = DESK_NAME_PATTERN.match(desk_name)
+    if match is None:
+        return None
+    floor_number, neighbourhood, bank, seat = match.groups()
+    return int(floor_number), neighbourhood.upper(), int(bank), int(seat)
+
+
+# Desk -> floor/neighbourhood lookup and floor -> desks sets for the whole building
+class NeighbourhoodRegistry:
+    def __init__(self, neighbourhoods=None):
+        self.neighbourhoods = {}  # floor -> neighbourhood -> list of desks
+        self.desk_floor = {}
+        self.desk_neighbourhood = {}
+        self.floor_desks = {}  # floor -> set of desks
+        self._configured_floors = set()
+        self._lock = threading.Lock()
+        for floor_name, floor_neighbourhoods in (neighbourhoods or {}).items():
+            self._configured_floors.add(floor_name)
+            for neighbourhood, desks in floor_neighbourhoods.items():
+                for desk in desks:
+                    self._add_desk(floor_name, neighbourhood, desk)
+
+    def _add_desk(self, floor_name, neighbourhood, desk):
+        self.neighbourhoods.setdefault(floor_name, {}).setdefault(neighbourhood, []).append(desk)
+        self.floor_desks.setdefault(floor_name, set()).add(desk)
+        self.desk_floor[desk] = floor_name
+        self.desk_neighbourhood[desk] = neighbourhood
+
+    # Adds the desks listed for each floor in a day's GetDesks data ({floor: {'desks': [...]}}).
+    # Desks that are already known keep their configured neighbourhood.
+    def add_floors(self, day_floors):
+        with self._lock:
+            for floor_name, floor in day_floors.items():
+                new_desks = [desk for desk in floor.get('desks', ()) if desk not in self.desk_floor]
+                for desk in sorted(new_desks):
+                    parsed = parse_desk_name(desk)
+                    if floor_name in self._configured_floors or parsed is None:
+                        neighbourhood = OTHER_NEIGHBOURHOOD
+                    else:
+                        neighbourhood = parsed[1]
+                    self._add_desk(floor_name, neighbourhood, desk)
+                if new_desks:
+                    self.neighbourhoods[floor_name] = dict(sorted(self.neighbourhoods[floor_name].items()))
+
+    def floors(self):
+        return sorted(self.neighbourhoods)
+
+    def neighbourhoods_on(self, floor_name):
+        return list(self.neighbourhoods.get(floor_name, {}))
+
+    def desks(self, floor_name, neighbourhood):
+        return self.neighbourhoods.get(floor_name, {}).get(neighbourhood, [])
+
+    def lookup(self, desk):
+        return self.desk_floor.get(desk), self.desk_neighbourhood.get(desk)
+
+
+# Function to load the registry from the neighbourhoods config file
+def load_registry(filename=NEIGHBOURHOODS_FILE):
+    if not os.path.exists(filename):
+        return NeighbourhoodRegistry()
+    with open(filename) as f:
+        return NeighbourhoodRegistry(json.load(f))
+
+
+# Function to count booked and available desks per date and neighbourhood on a floor
+def neighbourhood_occupancy(all_bookings, registry, floor_name):
+    floor_neighbourhoods = registry.neighbourhoods.get(floor_name, {})
+    totals = pd.Series({neighbourhood: len(desks) for neighbourhood, desks in floor_neighbourhoods.items()}, dtype=int)
+
+    df = all_bookings.loc[all_bookings['desk'].map(registry.desk_floor) == floor_name, ['date', 'desk']]
+    df = df.assign(neighbourhood=df['desk'].map(registry.desk_neighbourhood).astype(str))
+    booked = df.groupby(['date', 'neighbourhood'], observed=True)['desk'].nunique()
+
+    # Report every neighbourhood on every date, including those with no bookings
+    all_pairs = pd.MultiIndex.from_product([all_bookings['date'].drop_duplicates().sort_values(), totals.index], names=['date', 'neighbourhood'])
+    occupancy = booked.reindex(all_pairs, fill_value=0).rename('booked_desks').reset_index()
+    occupancy['total_desks'] = occupancy['neighbourhood'].map(totals)
+    occupancy['available_desks'] = occupancy['total_desks'] - occupancy['booked_desks']
+    return occupancy
@@ -0,0 +1,100 @@
+import datetime
+import os
+import threading
+import time
+
+from booking_cache import SHORT_TTL, building_scope
+from desk_booking import fetch_into_cache
+from fetch_scheduler import AUTH_STATUSES
+
+# Number of upcoming working days to keep warm, and how often to refresh them (seconds).
+# The interval is kept below the cache's short TTL so the days never go cold.
+PREFETCH_DAYS = 5
+PREFETCH_INTERVAL = SHORT_TTL * 0.8
+
+# Optional file of holiday dates ('YYYY-MM-DD', one per line) to skip when prefetching,
+# kept next to app.py
+HOLIDAYS_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "holidays.txt")
+
+AUTH_ERRORS = {f"HTTP {status}" for status in AUTH_STATUSES}
+
+
+# Function to load the configured holidays
+def load_holidays(filename=HOLIDAYS_FILE):
+    if not os.path.exists(filename):
+        return set()
+    with open(filename) as f:
+        return {line.strip() for line in f if line.strip() and not line.startswith('#')}
+
+
+# Function to list the next working days from today, skipping weekends and holidays
+def upcoming_working_days(days=PREFETCH_DAYS, holidays=(), today=None):
+    current = today or datetime.date.today()
+    working_days = []
+    while len(working_days) < days:
+        current_date = current.strftime('%Y-%m-%d')
+        if current.weekday() < 5 and current_date not in holidays:
+            working_days.append(current_date)
+        current += datetime.timedelta(days=1)
+    return working_days
+
+
+# Background thread that keeps the next few working days in the DayCache, using the
+# token it was given with set_headers. It stops using a token once the API rejects it.
+class Prefetcher:
+    def __init__(self, url, cache, days=PREFETCH_DAYS, interval=PREFETCH_INTERVAL, holidays=None, tuner=None, limiter=None):
+        self.url = url
+        self.cache = cache
+        self.days = days
+        self.interval = interval
+        self.holidays = load_holidays() if holidays is None else holidays
+        self.tuner = tuner
+        self.limiter = limiter
+        self.last_run = None
+        self.last_errors = {}
+        self._headers = None
+        self._thread = None
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+
+    def set_headers(self, headers):
+        with self._lock:
+            self._headers = dict(headers)
+
+    # Starts the background thread. A thread that has been stopped but is still finishing
+    # its last pass is left to exit on its own and replaced, each with its own stop event.
+    def start(self):
+        with self._lock:
+            if self.is_running():
+                return
+            self._stop = threading.Event()
+            self._thread = threading.Thread(target=self._run, args=(self._stop,), name="booking-prefetch", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def is_running(self):
+        return self._thread is not None and self._thread.is_alive() and not self._stop.is_set()
+
+    def refresh(self):
+        with self._lock:
+            headers = self._headers
+        if headers is None:
+            return
+        dates = upcoming_working_days(self.days, self.holidays)
+        _, _, errors = fetch_into_cache(self.url, headers, dates, self.cache, building_scope(self.url), limiter=self.limiter, tuner=self.tuner)
+        self.last_run = time.time()
+        self.last_errors = errors
+        if any(error in AUTH_ERRORS for error in errors.values()):  # wait for a new token to be set
+            with self._lock:
+                if self._headers == headers:
+                    self._headers = None
+
+    def _run(self, stop):
+        while not stop.is_set():
+            try:
+                self.refresh()
+            except Exception as e:  # never let one bad pass kill the thread
+                self.last_errors = {'refresh': str(e)}
+            stop.wait(self.interval)
@@ -0,0 +1,104 @@
+import numpy as np
+import pandas as pd
+
+from availability import find_free_desks
+from booking_table import format_dates
+from neighbourhoods import parse_desk_name
+
+# Walking distance between desks on a floor, in seats: moving to the next bank costs
+# BANK_DISTANCE and moving to another neighbourhood costs NEIGHBOURHOOD_DISTANCE
+BANK_DISTANCE = 10
+NEIGHBOURHOOD_DISTANCE = 100
+
+# Number of nearest desks kept for each desk
+MAX_NEIGHBOURS = 50
+
+
+# Desk -> nearest desks on the same floor, and bank -> desks, worked out from the desk
+# names (e.g. "Desk 6.A07.3" is floor 6, neighbourhood A, bank 07, seat 3). Each floor's
+# nearest desks are kept as arrays of desk positions and distances, one row per desk.
+class DeskClusters:
+    def __init__(self, desks, max_neighbours=MAX_NEIGHBOURS):
+        self.banks = {}  # (floor, neighbourhood, bank) -> desks in seat order
+        self.desk_bank = {}
+        self.floor_desks = {}  # floor -> desks, in position order
+        self.desk_position = {}  # desk -> position on its floor
+        self.neighbour_positions = {}  # floor -> int32 array, one row of nearest positions per desk
+        self.neighbour_distances = {}  # floor -> int16 array of the matching distances
+
+        parsed = {desk: parse_desk_name(desk) for desk in desks}
+        parsed = {desk: value for desk, value in parsed.items() if value is not None}
+        for desk, (floor_number, neighbourhood, bank, seat) in sorted(parsed.items(), key=lambda item: item[1]):
+            self.banks.setdefault((floor_number, neighbourhood, bank), []).append(desk)
+            self.desk_bank[desk] = (floor_number, neighbourhood, bank)
+
+        floors = {}
+        for desk, value in parsed.items():
+            floors.setdefault(value[0], []).append(desk)
+        for floor_number, floor_desks in floors.items():
+            self._add_floor(floor_number, floor_desks, parsed, max_neighbours)
+
+    # Returns a desk's nearest desks on its floor as [(distance, desk), ...], nearest first
+    def neighbours(self, desk):
+        if desk not in self.desk_position:
+            return []
+        floor_number = self.desk_bank[desk][0]
+        row = self.desk_position[desk]
+        floor_desks = self.floor_desks[floor_number]
+        positions = self.neighbour_positions[floor_number][row]
+        distances = self.neighbour_distances[floor_number][row]
+        return [(int(distance), floor_desks[position]) for distance, position in zip(distances, positions)]
+
+    # Precomputes each desk's nearest desks on a floor from one distance matrix
+    def _add_floor(self, floor_number, floor_desks, parsed, max_neighbours):
+        neighbourhoods = np.array([parsed[desk][1] for desk in floor_desks])
+        banks = np.array([parsed[desk][2] for desk in floor_desks])
+        seats = np.array([parsed[desk][3] for desk in floor_desks])
+
+        same_neighbourhood = neighbourhoods[:, None] == neighbourhoods[None, :]
+        bank_gap = np.abs(banks[:, None] - banks[None, :])
+        distance = np.where(
+            same_neighbourhood,
+            bank_gap * BANK_DISTANCE + np.where(bank_gap == 0, np.abs(seats[:, None] - seats[None, :]), 0),
+            NEIGHBOURHOOD_DISTANCE + bank_gap,
+        )
+        np.fill_diagonal(distance, -1)
+
+        nearest = np.argsort(distance, axis=1, kind='stable')[:, 1:max_neighbours + 1]
+        self.floor_desks[floor_number] = floor_desks
+        self.desk_position.update((desk, row) for row, desk in enumerate(floor_desks))
+        self.neighbour_positions[floor_number] = nearest.astype(np.int32)
+        self.neighbour_distances[floor_number] = np.take_along_axis(distance, nearest, axis=1).astype(np.int16)
+
+
+# Function to find the k nearest free desks to wherever the given people are booked, for each date.
+# Returns one row per suggested desk with the teammate it is nearest to.
+def desks_near_people(clusters, availability_index, all_bookings, people, dates, k=1, half='both'):
+    booked = all_bookings.loc[all_bookings['name'].isin(people), ['date', 'desk', 'name']]
+    booked = booked.assign(date=format_dates(booked['date']), desk=booked['desk'].astype(str), name=booked['name'].astype(str))
+
+    rows = []
+    for current_date in dates:
+        free = set(find_free_desks(availability_index, [current_date], half))
+        best = {}  # free desk -> (distance, teammate)
+        for anchor in booked[booked['date'] == current_date].itertuples(index=False):
+            for distance, desk in clusters.neighbours(anchor.desk):
+                if desk in free and (desk not in best or distance < best[desk][0]):
+                    best[desk] = (distance, anchor.name)
+        for desk, (distance, name) in sorted(best.items(), key=lambda item: (item[1][0], item[0]))[:k]:
+            rows.append({'date': current_date, 'desk': desk, 'near': name, 'distance': distance})
+    return pd.DataFrame(rows, columns=['date', 'desk', 'near', 'distance'])
+
+
+# Function to find banks with at least k desks free for each date, with the free desks in each,
+# most free desks first
+def banks_with_free_desks(clusters, availability_index, dates, k=2, half='both'):
+    rows = []
+    for current_date in dates:
+        free = set(find_free_desks(availability_index, [current_date], half))
+        for (floor_number, neighbourhood, bank), desks in clusters.banks.items():
+            free_desks = [desk for desk in desks if desk in free]
+            if len(free_desks) >= k:
+                rows.append({'date': current_date, 'bank': f"{floor_number}.{neighbourhood}{bank:02d}", 'free_desks': len(free_desks), 'desks': ", ".join(free_desks)})
+    df = pd.DataFrame(rows, columns=['date', 'bank', 'free_desks', 'desks'])
+    return df.sort_values(['date', 'free_desks', 'bank'], ascending=[True, False, True], kind='stable', ignore_index=True)
@@ -0,0 +1,211 @@
+import argparse
+import datetime
+import hmac
+import json
+import os
+import sys
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from booking_cache import MEMORY_BUDGET, DayCache, building_scope
+from booking_table import format_dates
+from desk_booking import (GET_DESKS_URL, build_desk_index, build_headers,
+                          build_occupancy_matrix, get_all_desk_bookings,
+                          get_desk_availability, get_person_bookings,
+                          occupancy_frame)
+from fetch_scheduler import AdaptiveLimiter, WindowTuner
+from metrics import METRICS
+from name_index import NameIndex, matched_names
+from neighbourhoods import load_registry
+
+# Local read-through JSON API over the booking data, for tools that would otherwise each
+# call Unity Place with their own token. Every client is served from one shared DayCache,
+# and all upstream calls share one concurrency limit, whatever the number of clients:
+#   UP_API_TOKEN=... UP_SERVICE_KEY=... python server.py --port 8502
+#
+#   GET /occupancy?start=2023-10-02&end=2023-10-06
+#   GET /availability?start=...&end=...&floor=Level 6&neighbourhood=A (Station)   (or &desk=... repeated)
+#   GET /people?start=...&end=...&name=Elon Musk&name=Jeff Bezos
+#   GET /health
+
+DEFAULT_PORT = 8502
+
+# Maximum number of upstream requests in flight at once, across all clients
+DEFAULT_MAX_UPSTREAM = 4
+
+# Longest date range a single request may ask for, in days
+MAX_RANGE_DAYS = 31
+
+
+# Raised for a request the service cannot answer, with the HTTP status to reply with
+class RequestError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+# Shared state behind the service: the upstream token, cache, limiter and registry
+class BookingService:
+    def __init__(self, url, token, max_upstream=DEFAULT_MAX_UPSTREAM, memory_budget=MEMORY_BUDGET, api_key=None):
+        self.url = url
+        self.headers = build_headers(token)
+        self.api_key = api_key
+        self.cache = DayCache(memory_budget=memory_budget)
+        self.limiter = AdaptiveLimiter(max_upstream)
+        self.tuner = WindowTuner()
+        self.registry = load_registry()
+        self.scope = building_scope(url)
+
+    # Returns the bookings and derived lookups for a range, from the cache when possible.
+    # Concurrent requests for the same days share one upstream fetch through the DayCache.
+    def booking_view(self, start_date, end_date):
+        range_key = (start_date.strftime('%Y-%m-%d'), end_date.strftime('%Y-%m-%d'))
+        view = self.cache.get_range(self.scope, *range_key)
+        if view is not None:
+            return view, {}
+
+        all_bookings, all_team_members, _, daily_desk_data_by_floor, fetch_errors = get_all_desk_bookings(
+            self.url, self.headers, start_date, end_date, cache=self.cache, limiter=self.limiter, tuner=self.tuner)
+        if not daily_desk_data_by_floor:
+            raise RequestError(502, f"Unity Place could not be reached: {sorted(set(fetch_errors.values()))}")
+        for floors in daily_desk_data_by_floor.values():
+            self.registry.add_floors(floors)
+
+        view = {
+            'all_bookings': all_bookings,
+            'name_index': NameIndex(all_team_members),
+            'desk_index': build_desk_index(all_bookings),
+            'daily_desk_data_by_floor': daily_desk_data_by_floor,
+        }
+        if not fetch_errors:  # only complete ranges are cached
+            self.cache.put_range(self.scope, *range_key, view)
+        return view, fetch_errors
+
+    def occupancy(self, query):
+        start_date, end_date = parse_range(query)
+        view, errors = self.booking_view(start_date, end_date)
+        occupancy = occupancy_frame(build_occupancy_matrix(view['daily_desk_data_by_floor']))
+        return {'occupancy': occupancy.to_dict('records'), 'errors': errors}
+
+    def availability(self, query):
+        start_date, end_date = parse_range(query)
+        view, errors = self.booking_view(start_date, end_date)
+        desk_names = query.get('desk', [])
+        if not desk_names:
+            if 'floor' not in query or 'neighbourhood' not in query:
+                raise RequestError(400, "Give desk names with desk=, or a floor= and neighbourhood=")
+            desk_names = self.registry.desks(query['floor'][0], query['neighbourhood'][0])
+            if not desk_names:
+                raise RequestError(404, f"Unknown neighbourhood: {query['floor'][0]} / {query['neighbourhood'][0]}")
+        availability = get_desk_availability(desk_names, view['all_bookings'], start_date, end_date, desk_index=view['desk_index'])
+        availability['date'] = format_dates(availability['date'])
+        return {'availability': availability.to_dict('records'), 'errors': errors}
+
+    def people(self, query):
+        start_date, end_date = parse_range(query)
+        if not query.get('name'):
+            raise RequestError(400, "Give at least one name with name=")
+        view, errors = self.booking_view(start_date, end_date)
+        resolved = view['name_index'].resolve(query['name'])
+        bookings = get_person_bookings(matched_names(resolved), view['all_bookings'], start_date, end_date)
+        return {
+            'bookings': bookings.to_dict('records'),
+            'names': resolved.to_dict('records'),
+            'errors': errors,
+        }
+
+    def health(self, query):
+        return {'status': 'ok', 'cache': self.cache.footprint(), 'upstream_limit': self.limiter.limit, 'metrics': METRICS.snapshot()['counters']}
+
+
+# Function to read and check the start and end dates of a request
+def parse_range(query):
+    try:
+        start_date = datetime.date.fromisoformat(query['start'][0])
+        end_date = datetime.date.fromisoformat(query.get('end', query['start'])[0])
+    except (KeyError, ValueError):
+        raise RequestError(400, "Give start= (and optionally end=) as YYYY-MM-DD dates")
+    if end_date < start_date:
+        raise RequestError(400, "end must not be before start")
+    if (end_date - start_date).days >= MAX_RANGE_DAYS:
+        raise RequestError(400, f"Ranges are limited to {MAX_RANGE_DAYS} days")
+    return start_date, end_date
+
+
+# Handles one client request, dispatching GET paths to the BookingService
+class BookingRequestHandler(BaseHTTPRequestHandler):
+    service = None  # set by make_server
+    routes = {'/occupancy': 'occupancy', '/availability': 'availability', '/people': 'people', '/health': 'health'}
+
+    def do_GET(self):
+        request = urlparse(self.path)
+        try:
+            if request.path not in self.routes:
+                raise RequestError(404, f"Unknown endpoint: {request.path}")
+            if request.path != '/health' and not self.is_authorised():
+                raise RequestError(401, "A valid service key is required")
+            with METRICS.timer('service_request_seconds', endpoint=request.path):
+                body = getattr(self.service, self.routes[request.path])(parse_qs(request.query))
+            self.send_json(200, body)
+        except RequestError as e:
+            self.send_json(e.status, {'error': str(e)})
+        except Exception as e:  # keep serving other clients
+            self.send_json(500, {'error': f"Internal error: {e.__class__.__name__}"})
+
+    # Checks the client's service key, when the service has one
+    def is_authorised(self):
+        if not self.service.api_key:
+            return True
+        supplied = self.headers.get("X-API-Key") or self.headers.get("Authorization", "").removeprefix("Bearer ")
+        return hmac.compare_digest(supplied.encode(), self.service.api_key.encode())
+
+    def send_json(self, status, body):
+        content = json.dumps(body, default=str).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    def log_message(self, format, *args):
+        sys.stderr.write(f"{self.address_string()} - {format % args}\n")
+
+
+# Function to create the HTTP server for a BookingService
+def make_server(service, host="127.0.0.1", port=DEFAULT_PORT):
+    handler = type("Handler", (BookingRequestHandler,), {'service': service})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve Unity Place desk booking data as a local JSON API.")
+    parser.add_argument("--token", default=os.environ.get("UP_API_TOKEN"), help="API token used for all upstream calls (defaults to UP_API_TOKEN)")
+    parser.add_argument("--url", default=GET_DESKS_URL, help="GetDesks API URL")
+    parser.add_argument("--host", default="127.0.0.1", help="address to listen on (default: 127.0.0.1)")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--max-upstream", type=int, default=DEFAULT_MAX_UPSTREAM, help="maximum upstream requests in flight across all clients")
+    parser.add_argument("--cache-budget-mb", type=int, default=MEMORY_BUDGET // (1024 * 1024), help="memory budget for cached data, in MB")
+    parser.add_argument("--api-key", default=os.environ.get("UP_SERVICE_KEY"), help="key clients must send as X-API-Key or a bearer token (defaults to UP_SERVICE_KEY)")
+    args = parser.parse_args(argv)
+
+    if not args.token:
+        parser.error("an API token is required: pass --token or set UP_API_TOKEN")
+    if not args.api_key and args.host not in ("127.0.0.1", "localhost"):
+        parser.error("a service key is required when listening beyond localhost: pass --api-key or set UP_SERVICE_KEY")
+
+    service = BookingService(args.url, args.token, args.max_upstream, args.cache_budget_mb * 1024 * 1024, args.api_key)
+    server = make_server(service, args.host, args.port)
+    print(f"Serving on http://{args.host}:{args.port}", file=sys.stderr)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
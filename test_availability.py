@@ -0,0 +1,32 @@
+from availability import build_availability_index, find_free_desks
+from booking_table import RAW_COLUMNS, bookings_frame
+
+# Thursday 4th, Friday 5th, Monday 8th and Wednesday 10th January 2024
+DATES = ['2024-01-04', '2024-01-05', '2024-01-08', '2024-01-10']
+
+
+def make_index():
+    rows = [
+        ('2024-01-10', 'Level 1', 'Desk A', 'Jane Doe', '08:00:00', '18:00:00', 'Booked'),
+        ('2024-01-05', 'Level 1', 'Desk B', 'John Roe', '08:00:00', '12:00:00', 'Booked'),
+        ('2024-01-08', 'Level 1', 'Desk C', 'Jane Doe', '08:00:00', '18:00:00', 'Booked'),
+    ]
+    all_bookings = bookings_frame(dict(zip(RAW_COLUMNS, map(list, zip(*rows)))))
+    floors = {'Level 1': {'desks': ('Desk A', 'Desk B', 'Desk C', 'Desk D')}}  # Desk D is never booked
+    return build_availability_index(all_bookings, {current_date: floors for current_date in DATES})
+
+
+def test_free_on_every_day_includes_desks_that_were_never_booked():
+    assert find_free_desks(make_index(), DATES) == ['Desk D']
+
+
+def test_days_in_a_row_are_adjacent_days_whatever_order_they_are_given_in():
+    index = make_index()
+    # Wednesday and Thursday are not adjacent, so no desk is free for two days in a row
+    assert find_free_desks(index, ['2024-01-10', '2024-01-04'], consecutive=2) == []
+    # A weekend is not a gap: Friday and Monday are two days in a row
+    assert find_free_desks(index, ['2024-01-08', '2024-01-05'], consecutive=2) == ['Desk A', 'Desk D']
+    assert find_free_desks(index, ['2024-01-08', '2024-01-05'], 'pm', consecutive=2) == ['Desk A', 'Desk B', 'Desk D']
+    # The run from Thursday to Monday ends at the gap before Wednesday
+    assert find_free_desks(index, DATES[::-1], consecutive=3) == ['Desk A', 'Desk D']
+    assert find_free_desks(index, DATES, consecutive=4) == []
@@ -0,0 +1,183 @@
+import datetime
+import io
+import json
+import threading
+import time
+from unittest import mock
+
+import pandas as pd
+import requests
+from requests.adapters import BaseAdapter, HTTPAdapter
+from urllib3.response import HTTPResponse
+
+import desk_booking
+from booking_cache import DayCache, building_scope
+from desk_booking import authorise_token, build_headers, get_all_desk_bookings
+from metrics import METRICS
+
+URL = "https://example.test/GetDesks"
+VALID_TOKEN = "valid"
+START_DATE = datetime.date(2024, 1, 1)
+END_DATE = datetime.date(2024, 1, 3)
+
+
+# Function to make one floor of a GetDesks response from {desk: booked name or None}
+def make_floor(floor_name, bookings):
+    desks = []
+    for desk, name in bookings.items():
+        user = {"name": name} if name else None
+        desks.append({"name": desk, "timeSlots": [{"startTime": "08:00:00", "endTime": "18:00:00", "availability": "Booked" if name else "Available", "user": user}]})
+    return {"floorName": floor_name, "desks": desks}
+
+
+# Transport adapter answering GetDesks requests for VALID_TOKEN only, counting requests per token.
+# With an etag, responses carry it and a request sending it back gets a 304.
+class FakeGetDesks(BaseAdapter):
+    def __init__(self, delay=0.05, floors=None, etag=None):
+        super().__init__()
+        self.delay = delay
+        self.floors = floors or [make_floor("Level 1", {"Desk 1.A01.1": "Jane Doe"})]
+        self.etag = etag
+        self.calls = {}
+        self.not_modified = 0
+        self._lock = threading.Lock()
+        self._responses = HTTPAdapter()
+
+    def send(self, request, **kwargs):
+        token = request.headers["Authorization"].removeprefix("Bearer ")
+        with self._lock:
+            self.calls[token] = self.calls.get(token, 0) + 1
+        time.sleep(self.delay)
+        headers = {"Content-Type": "application/json"}
+        if token != VALID_TOKEN:
+            body, status = b'{"message": "Unauthorized"}', 401
+        elif self.etag and request.headers.get("If-None-Match") == self.etag:
+            self.not_modified += 1
+            body, status = b'', 304
+        else:
+            body, status = json.dumps({"floors": self.floors}).encode(), 200
+            if self.etag:
+                headers["ETag"] = self.etag
+        raw = HTTPResponse(body=io.BytesIO(body), status=status, headers=headers, preload_content=False)
+        return self._responses.build_response(request, raw)
+
+    def close(self):
+        pass
+
+
+def patched_sessions(adapter):
+    def create_session(max_workers=desk_booking.DEFAULT_MAX_WORKERS):
+        session = requests.Session()
+        session.mount("https://", adapter)
+        return session
+    return mock.patch.object(desk_booking, "create_session", create_session)
+
+
+# Function to call get_all_desk_bookings from several threads at once
+def fetch_concurrently(cache, tokens):
+    results = [None] * len(tokens)
+
+    def fetch(position):
+        results[position] = get_all_desk_bookings(URL, build_headers(tokens[position]), START_DATE, END_DATE, cache=cache)
+
+    threads = [threading.Thread(target=fetch, args=(position,)) for position in range(len(tokens))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+
+def test_unauthorised_token_gets_nothing_from_a_warm_cache():
+    adapter = FakeGetDesks()
+    cache = DayCache()
+    with patched_sessions(adapter):
+        all_bookings, _, _, daily_desk_data_by_floor, _ = get_all_desk_bookings(URL, build_headers(VALID_TOKEN), START_DATE, END_DATE, cache=cache)
+        assert len(all_bookings) == 3 and len(daily_desk_data_by_floor) == 3
+
+        all_bookings, team_members, _, daily_desk_data_by_floor, fetch_errors = get_all_desk_bookings(URL, build_headers("stolen"), START_DATE, END_DATE, cache=cache)
+
+    assert len(all_bookings) == 0
+    assert team_members == [] and daily_desk_data_by_floor == {}
+    assert fetch_errors == {'2024-01-01': "HTTP 401", '2024-01-02': "HTTP 401", '2024-01-03': "HTTP 401"}
+    assert not cache.is_authorised(build_headers("stolen"))
+
+
+def test_concurrent_checks_of_one_token_share_one_upstream_call():
+    adapter = FakeGetDesks()
+    cache = DayCache()
+    with patched_sessions(adapter):
+        get_all_desk_bookings(URL, build_headers(VALID_TOKEN), START_DATE, END_DATE, cache=cache)
+        results = fetch_concurrently(cache, ["stolen"] * 10)
+
+    assert adapter.calls["stolen"] == 1
+    assert all(len(all_bookings) == 0 and len(fetch_errors) == 3 for all_bookings, _, _, _, fetch_errors in results)
+
+
+def test_clients_waiting_on_a_fetch_with_the_same_token_are_not_checked_again():
+    single, shared = FakeGetDesks(), FakeGetDesks()
+    with patched_sessions(single):
+        fetch_concurrently(DayCache(), [VALID_TOKEN])
+    with patched_sessions(shared):
+        results = fetch_concurrently(DayCache(), [VALID_TOKEN] * 10)
+
+    assert all(len(all_bookings) == 3 for all_bookings, _, _, _, _ in results)
+    assert shared.calls[VALID_TOKEN] == single.calls[VALID_TOKEN]
+
+
+def test_token_check_leaves_another_callers_claim_on_its_day_in_place():
+    adapter = FakeGetDesks()
+    cache = DayCache()
+    scope = building_scope(URL)
+    owned, _ = cache.claim(scope, ['2024-01-01'])
+    with patched_sessions(adapter):
+        assert authorise_token(URL, build_headers(VALID_TOKEN), cache, '2024-01-01') is None
+
+    assert cache.get(scope, '2024-01-01') is not None
+    _, waiting = cache.claim(scope, ['2024-01-01'])
+    assert owned == ['2024-01-01'] and not waiting['2024-01-01'].is_set()
+    cache.release(scope, '2024-01-01')
+    assert waiting['2024-01-01'].is_set()
+
+
+# Function to read a counter from the process-wide metrics
+def counter(name):
+    return METRICS.counters.get((name, ()), 0)
+
+
+def test_refetch_reparses_only_the_changed_floor():
+    floors = {f"Level {level}": {f"Desk {level}.A01.{seat}": f"Person {level}{seat}" if seat % 2 else None for seat in range(1, 5)} for level in range(1, 4)}
+    adapter = FakeGetDesks(delay=0, floors=[make_floor(floor_name, bookings) for floor_name, bookings in floors.items()])
+    cache = DayCache(short_ttl=0, long_ttl=0)  # every day expires at once, so each fetch is a re-fetch
+    with patched_sessions(adapter):
+        get_all_desk_bookings(URL, build_headers(VALID_TOKEN), START_DATE, START_DATE, cache=cache)
+
+        floors["Level 2"]["Desk 2.A01.2"] = "New Starter"
+        adapter.floors = [make_floor(floor_name, bookings) for floor_name, bookings in floors.items()]
+        reused, parsed = counter('floors_reused'), counter('floors_parsed')
+        all_bookings, _, _, daily_desk_data_by_floor, _ = get_all_desk_bookings(URL, build_headers(VALID_TOKEN), START_DATE, START_DATE, cache=cache)
+        assert (counter('floors_reused') - reused, counter('floors_parsed') - parsed) == (2, 1)
+
+        full_bookings, _, _, full_floors, _ = get_all_desk_bookings(URL, build_headers(VALID_TOKEN), START_DATE, START_DATE)
+
+    pd.testing.assert_frame_equal(all_bookings, full_bookings)
+    assert daily_desk_data_by_floor == full_floors
+    assert "New Starter" in set(all_bookings['name'].astype(str))
+    assert list(all_bookings['floor'].astype(str).unique()) == ["Level 1", "Level 2", "Level 3"]
+
+
+def test_not_modified_response_reuses_the_cached_day():
+    adapter = FakeGetDesks(delay=0, etag='"v1"')
+    cache = DayCache(short_ttl=0, long_ttl=0)
+    scope = building_scope(URL)
+    with patched_sessions(adapter):
+        first_bookings, _, _, first_floors, _ = get_all_desk_bookings(URL, build_headers(VALID_TOKEN), START_DATE, START_DATE, cache=cache)
+        cached_day, validators = cache.get_stale(scope, '2024-01-01')
+        assert validators == {'etag': '"v1"', 'last_modified': None}
+
+        all_bookings, _, _, daily_desk_data_by_floor, fetch_errors = get_all_desk_bookings(URL, build_headers(VALID_TOKEN), START_DATE, START_DATE, cache=cache)
+
+    assert adapter.not_modified == 1 and fetch_errors == {}
+    assert cache.get_stale(scope, '2024-01-01')[0] is cached_day
+    pd.testing.assert_frame_equal(all_bookings, first_bookings)
+    assert daily_desk_data_by_floor == first_floors
@@ -0,0 +1,27 @@
+from name_index import NameIndex
+
+NAMES = ["Zoë O'Brien", "Jeff Bezos", "Alex Smith", "Alex Smith ", "Priya Patel", "Priya Patil"]
+
+
+def test_match_statuses():
+    index = NameIndex(NAMES)
+    # Case, accents, punctuation and name order are ignored
+    assert index.match("ZOE O'BRIEN")[:2] == ('exact', "Zoë O'Brien")
+    assert index.match("O'Brien, Zoë")[:2] == ('exact', "Zoë O'Brien")
+    # Two people normalizing to the same name cannot be told apart
+    status, match, _, candidates = index.match("alex smith")
+    assert (status, match, candidates) == ('ambiguous', None, ["Alex Smith", "Alex Smith "])
+    # A close spelling matches the one person it is close to
+    status, match, score, _ = index.match("Jef Bezos")
+    assert (status, match) == ('fuzzy', "Jeff Bezos") and 0.6 <= score < 1
+    # ...unless it is as close to someone else
+    status, match, _, candidates = index.match("Priya Patl")
+    assert (status, match) == ('ambiguous', None) and set(candidates) == {"Priya Patel", "Priya Patil"}
+    assert index.match("Jef Bezos", fuzzy=False)[0] == 'unmatched'
+    assert index.match("Nobody Here")[:2] == ('unmatched', None)
+
+
+def test_resolve_lists_every_roster_name():
+    resolved = NameIndex(NAMES).resolve(["jeff bezos", "Nobody Here"])
+    assert resolved['status'].tolist() == ['exact', 'unmatched']
+    assert resolved['match'].tolist()[0] == "Jeff Bezos" and resolved['match'].isna().tolist() == [False, True]